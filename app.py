@@ -1,18 +1,35 @@
 import os
 import logging
 from flask import Flask
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.orm import DeclarativeBase
 from werkzeug.middleware.proxy_fix import ProxyFix
 from flask import jsonify
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
+# Configure logging (LOG_LEVEL=DEBUG for development; DEBUG on hot paths is costly)
+logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO").upper())
 
 # Create the app
 app = Flask(__name__)
 app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key-change-in-production")
 app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
 
+class Base(DeclarativeBase):
+    pass
 
+# Database (used by data_processor and by the routes when CROP_DATA_SOURCE=database)
+db = SQLAlchemy(model_class=Base)
+app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "sqlite:///crop_data.db")
+if not app.config["SQLALCHEMY_DATABASE_URI"].startswith("sqlite"):
+    # Pooled connections: checked before use (pre_ping) and recycled before server-side timeouts
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+        "pool_size": int(os.environ.get("DB_POOL_SIZE", 10)),
+        "max_overflow": int(os.environ.get("DB_MAX_OVERFLOW", 20)),
+        "pool_timeout": 30,
+        "pool_recycle": 300,
+        "pool_pre_ping": True
+    }
+db.init_app(app)
 
 # Import routes
 import routes
\ No newline at end of file
@@ -0,0 +1,608 @@
+import argparse
+import contextlib
+import gzip
+import io
+import json
+import logging
+import math
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+import openpyxl
+from boundary_index import IBGE_STATE_PREFIXES
+
+# The app modules are imported after moving into the work directory
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+BENCHMARK_DIR = 'data/benchmarks'
+# Synthetic workbooks, state GeoJSON and the artifacts built from them; the benchmarks run inside it
+WORK_DIR = f'{BENCHMARK_DIR}/work'
+RESULTS_DIR = f'{BENCHMARK_DIR}/results'
+FIXTURE_FILE = 'fixture.json'
+RESULTS_VERSION = 2
+
+# Municipalities per state in the IBGE territorial division (5,570 in total)
+STATE_MUNICIPALITIES = {
+    'RO': 52, 'AC': 22, 'AM': 62, 'RR': 15, 'PA': 144, 'AP': 16, 'TO': 139, 'MA': 217, 'PI': 224,
+    'CE': 184, 'RN': 167, 'PB': 223, 'PE': 185, 'AL': 102, 'SE': 75, 'BA': 417, 'MG': 853, 'ES': 78,
+    'RJ': 92, 'SP': 645, 'PR': 399, 'SC': 295, 'RS': 497, 'MS': 79, 'MT': 141, 'GO': 246, 'DF': 1
+}
+STATE_PREFIXES = {state: prefix for prefix, state in IBGE_STATE_PREFIXES.items()}
+
+CROP_NAMES = [
+    'Abacate', 'Abacaxi*', 'Alfafa fenada', 'Algodão arbóreo (em caroço)', 'Algodão herbáceo (em caroço)',
+    'Alho', 'Amendoim (em casca)', 'Arroz (em casca)', 'Aveia (em grão)', 'Azeitona', 'Banana (cacho)',
+    'Batata-doce', 'Batata-inglesa', 'Borracha (látex coagulado)', 'Cacau (em amêndoa)', 'Café (em grão) Total',
+    'Cana-de-açúcar', 'Caqui', 'Castanha de caju', 'Cebola', 'Centeio (em grão)', 'Cevada (em grão)',
+    'Chá-da-índia (folha verde)', 'Coco-da-baía*', 'Dendê (cacho de coco)', 'Erva-mate (folha verde)',
+    'Ervilha (em grão)', 'Fava (em grão)', 'Feijão (em grão)', 'Figo', 'Fumo (em folha)', 'Girassol (em grão)',
+    'Goiaba', 'Guaraná (semente)', 'Juta (fibra)', 'Laranja', 'Limão', 'Linho (semente)', 'Maçã',
+    'Malva (fibra)', 'Mamão', 'Mamona (baga)', 'Mandioca', 'Manga', 'Maracujá', 'Marmelo', 'Melancia', 'Melão',
+    'Milho (em grão)', 'Noz (fruto seco)', 'Palmito', 'Pera', 'Pêssego', 'Pimenta-do-reino', 'Rami (fibra)',
+    'Sisal ou agave (fibra)', 'Soja (em grão)', 'Sorgo (em grão)', 'Tangerina', 'Tomate', 'Trigo (em grão)',
+    'Triticale (em grão)', 'Tungue (fruto seco)', 'Urucum (semente)', 'Uva'
+]
+NAME_STARTS = [
+    'São', 'Santa', 'Nova', 'Bom', 'Porto', 'Campo', 'Rio', 'Serra', 'Vila', 'Alto', 'Três', 'Barra', 'Lagoa',
+    'Monte', 'Ponte', 'Santo Antônio', 'Governador', 'Presidente', 'Conceição', 'Itapi'
+]
+NAME_ENDS = [
+    'Alegre', 'Esperança', 'de Jesus', 'Vista', 'Bonito', 'Grande', 'Verde', 'Branco', 'das Pedras', 'Palmeiras',
+    'da Conceição', 'Aparecida', 'de Fátima', 'Jardim', 'Horizonte', 'do Sul', 'do Norte', 'das Flores',
+    'dos Campos', 'Mirim'
+]
+
+# Default fixture: national scale, with the share of (municipality, crop) cells that have an area in the
+# real harvested area sheets (most cells are "-")
+DEFAULT_FIXTURE = {'municipalities': 5570, 'crops': 70, 'years': [2023, 2024], 'density': 0.2, 'seed': 1}
+# Lattice steps per municipality side in the GeoJSON fixtures (4 sides, so 4x vertices per polygon)
+EDGE_STEPS = 12
+# Zooms of the vector tile fixture (the tile route only reads it)
+TILE_ZOOMS = (3, 6)
+
+# Requests per route after WARMUP_REQUESTS, and the time after which a slow route stops early
+ROUTE_REQUESTS = 200
+WARMUP_REQUESTS = 3
+ROUTE_TIME_LIMIT = 10.0
+# Runs per ingestion benchmark (each one rebuilds everything)
+INGEST_RUNS = 3
+LOAD_RUNS = 5
+# Endpoints that change state are not benchmarked
+SKIPPED_ENDPOINTS = {'static', 'reload_dataset'}
+
+# compare: relative change that counts as a regression, p99 gets more slack (it is the noisiest number),
+# and latency changes below MIN_LATENCY_DELTA_MS are noise whatever their ratio
+REGRESSION_THRESHOLD = 0.10
+P99_THRESHOLD_FACTOR = 2
+MIN_LATENCY_DELTA_MS = 0.05
+
+INGEST_BENCHMARKS = ('load_crop_data', 'process_complete_ibge_data', 'process_ibge_data', 'combine_geojson_files')
+BENCHMARKS = ('routes',) + INGEST_BENCHMARKS
+
+def fixture_config(municipalities=None, crops=None, density=None, seed=None):
+    config = dict(DEFAULT_FIXTURE)
+    for key, value in (('municipalities', municipalities), ('crops', crops), ('density', density), ('seed', seed)):
+        if value is not None:
+            config[key] = value
+    return config
+
+def state_counts(total):
+    """Municipalities per state, scaled from the IBGE counts to the requested total"""
+    scale = total / sum(STATE_MUNICIPALITIES.values())
+    return {state: max(1, round(count * scale)) for state, count in STATE_MUNICIPALITIES.items()}
+
+def crop_names(count):
+    return CROP_NAMES[:count] + [f'Cultura {i}' for i in range(len(CROP_NAMES) + 1, count + 1)]
+
+def synthetic_municipalities(config, rng):
+    """[(code, name, state)] with IBGE-shaped codes and repeated, accented names like the real ones"""
+    municipalities = []
+    for state, count in state_counts(config['municipalities']).items():
+        seen = {}
+        for i in range(count):
+            name = f'{rng.choice(NAME_STARTS)} {rng.choice(NAME_ENDS)}'
+            seen[name] = seen.get(name, 0) + 1
+            if seen[name] > 1:
+                name = f'{name} {seen[name]}'
+            municipalities.append((f'{STATE_PREFIXES[state]}{i + 1:05d}', name, state))
+    return municipalities
+
+def synthetic_areas(config, municipalities, crops, rng):
+    """{year: {(code, crop): hectares}}; the same cells are planted every year, with yearly variation"""
+    base = {}
+    for code, _, _ in municipalities:
+        for crop_name in crops:
+            if rng.random() < config['density']:
+                base[(code, crop_name)] = max(1, int(rng.lognormvariate(5, 2)))
+    return {
+        year: {cell: max(1, int(area * rng.uniform(0.8, 1.25))) for cell, area in base.items()}
+        for year in config['years']
+    }
+
+def write_workbook(path, year, municipalities, crops, areas):
+    """IBGE-style harvested area sheet: code, "MUNICÍPIO (UF)", then one column per crop with "-" for no data"""
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet(f'Tabela {year}')
+    sheet.append(['Cód.', 'Município'] + crops)
+    for code, name, state in municipalities:
+        sheet.append([code, f'{name} ({state})'] + [areas.get((code, crop_name), '-') for crop_name in crops])
+    workbook.save(path)
+
+def lattice_jitter(a, b):
+    """Deterministic offset in [-0.3, 0.3) of a lattice point, so both neighbours draw the same border"""
+    return ((a * 73856093) ^ (b * 19349663)) % 1000 / 1000 * 0.6 - 0.3
+
+def cell_ring(i, j, origin, step):
+    """Closed counterclockwise ring of grid cell (i, j), with wiggly borders shared with its neighbours"""
+    lattice = (
+        [(i * EDGE_STEPS + k, j * EDGE_STEPS) for k in range(EDGE_STEPS)]
+        + [((i + 1) * EDGE_STEPS, j * EDGE_STEPS + k) for k in range(EDGE_STEPS)]
+        + [((i + 1) * EDGE_STEPS - k, (j + 1) * EDGE_STEPS) for k in range(EDGE_STEPS)]
+        + [(i * EDGE_STEPS, (j + 1) * EDGE_STEPS - k) for k in range(EDGE_STEPS)]
+    )
+    ring = []
+    for a, b in lattice:
+        # Only points inside a border move, and only across it; corners stay put
+        x = a + (lattice_jitter(a, b) if a % EDGE_STEPS == 0 and b % EDGE_STEPS else 0)
+        y = b + (lattice_jitter(b, a) if b % EDGE_STEPS == 0 and a % EDGE_STEPS else 0)
+        ring.append([round(origin[0] + x * step[0], 6), round(origin[1] + y * step[1], 6)])
+    ring.append(ring[0])
+    return ring
+
+def write_state_geojson(path, state_index, municipalities):
+    """One state of municipalities as adjacent grid cells inside its own block of the map of Brazil"""
+    block_columns, block_width, block_height = 6, 6.5, 7.6
+    block_x = -74 + (state_index % block_columns) * block_width
+    block_y = -33 + (state_index // block_columns) * block_height
+    columns = math.ceil(math.sqrt(len(municipalities)))
+    rows = math.ceil(len(municipalities) / columns)
+    cell_width = block_width * 0.9 / columns
+    cell_height = block_height * 0.9 / rows
+    step = (cell_width / EDGE_STEPS, cell_height / EDGE_STEPS)
+    features = []
+    for n, (code, name, state) in enumerate(municipalities):
+        features.append({
+            'type': 'Feature',
+            'properties': {'CD_MUN': code, 'NM_MUN': name, 'SIGLA_UF': state},
+            'geometry': {'type': 'Polygon', 'coordinates': [cell_ring(n % columns, n // columns, (block_x, block_y), step)]}
+        })
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'type': 'FeatureCollection', 'features': features}, f, ensure_ascii=False)
+    return features[0]
+
+def read_fixture(work_dir):
+    try:
+        with open(os.path.join(work_dir, FIXTURE_FILE), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def generate_fixture(work_dir, config):
+    """Write the synthetic workbooks and state GeoJSON into work_dir, then build the served artifacts from them"""
+    if os.path.exists(work_dir):
+        if os.listdir(work_dir) and read_fixture(work_dir) is None:
+            raise ValueError(f'{work_dir} não é um diretório de benchmark; escolha outro --workdir')
+        shutil.rmtree(work_dir)
+    os.makedirs(os.path.join(work_dir, 'data'))
+    os.makedirs(os.path.join(work_dir, 'static', 'data'))
+
+    rng = random.Random(config['seed'])
+    crops = crop_names(config['crops'])
+    municipalities = synthetic_municipalities(config, rng)
+    areas = synthetic_areas(config, municipalities, crops, rng)
+    workbooks = []
+    for year in config['years']:
+        path = f'data/ibge_{year}_hectares_colhidos.xlsx'
+        write_workbook(os.path.join(work_dir, path), year, municipalities, crops, areas[year])
+        workbooks.append(path)
+
+    by_state = {}
+    for municipality in municipalities:
+        by_state.setdefault(municipality[2], []).append(municipality)
+    for state_index, (state, state_municipalities) in enumerate(by_state.items()):
+        first_feature = write_state_geojson(
+            os.path.join(work_dir, 'static', 'data', f'{state}.geojson'), state_index, state_municipalities
+        )
+
+    # Sample parameters for the route requests
+    code, name, _ = municipalities[len(municipalities) // 2]
+    with_area = {crop_name for _, crop_name in areas[config['years'][-1]]}
+    ring = first_feature['geometry']['coordinates'][0]
+    fixture = {
+        'config': config,
+        'workbooks': workbooks,
+        'crops': [crop_name for crop_name in crops if crop_name in with_area],
+        'municipality': code,
+        'municipality_name': name,
+        'names': sorted({name for _, name, _ in municipalities}),
+        'tile_point': ring[0],
+        'bbox': [-50.0, -25.0, -45.0, -20.0]
+    }
+    run_isolated(build_artifacts, work_dir)
+    with open(os.path.join(work_dir, FIXTURE_FILE), 'w', encoding='utf-8') as f:
+        json.dump(fixture, f, ensure_ascii=False, indent=2)
+    return fixture
+
+def ensure_fixture(work_dir, config):
+    """Reuse the fixture in work_dir when it was generated with the same config"""
+    fixture = read_fixture(work_dir)
+    if fixture and fixture['config'] == config:
+        return fixture
+    print(f'Gerando dados sintéticos em {work_dir} ({config["municipalities"]} municípios, {config["crops"]} culturas)...')
+    return generate_fixture(work_dir, config)
+
+def enter_work_dir(work_dir):
+    """Point the app at work_dir (its modules use paths relative to the working directory); call before importing it"""
+    if REPO_DIR not in sys.path:
+        sys.path.insert(0, REPO_DIR)
+    os.chdir(work_dir)
+    os.environ['CROP_DATA_SOURCE'] = 'json'
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.abspath("benchmark.db")}'
+    os.environ['LOG_LEVEL'] = 'WARNING'
+    os.environ['REQUEST_LOG_SAMPLE_RATE'] = '0'
+    os.environ['PROFILE_REQUEST_RATE'] = '0'
+    # The ingestion scripts log every crop at INFO
+    logging.disable(logging.INFO)
+
+def build_artifacts(work_dir):
+    """Untimed setup (runs in a fresh process): crop dataset, combined boundaries and vector tiles"""
+    enter_work_dir(work_dir)
+    from process_full_ibge_data import process_complete_ibge_data
+    from combine_geojson import combine_geojson_files
+    from vector_tiles import build_vector_tiles
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = process_complete_ibge_data(force=True)
+        if not result['success']:
+            raise RuntimeError(f'Falha ao gerar o dataset sintético: {result["error"]}')
+        combine_geojson_files()
+        build_vector_tiles(min_zoom=TILE_ZOOMS[0], max_zoom=TILE_ZOOMS[1])
+
+def run_isolated(function, *args):
+    """Run function in a fresh process, so imports, caches and peak memory start clean"""
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+        return executor.submit(function, *args).result()
+
+def peak_rss_mib():
+    """Peak resident memory of this process or of any process it waited for, None where it is not available
+
+    ru_maxrss only grows over the life of a process, so it is read once at the end of each isolated run.
+    It is in KiB on Linux and in bytes on macOS; the resource module does not exist on Windows.
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    )
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+def percentile(sorted_values, share):
+    """Nearest-rank percentile of an ascending list"""
+    return sorted_values[max(math.ceil(share * len(sorted_values)) - 1, 0)]
+
+def summarize(durations, **extra):
+    """Latency distribution (ms) and throughput of a list of durations in seconds"""
+    ordered = sorted(durations)
+    total = sum(ordered)
+    return {
+        'runs': len(ordered),
+        'seconds': total,
+        'throughput_per_second': len(ordered) / total if total else None,
+        'mean_ms': total / len(ordered) * 1000,
+        'min_ms': ordered[0] * 1000,
+        'p50_ms': percentile(ordered, 0.50) * 1000,
+        'p99_ms': percentile(ordered, 0.99) * 1000,
+        **extra
+    }
+
+def time_runs(function, runs):
+    durations = []
+    result = None
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = function()
+        durations.append(time.perf_counter() - started)
+    return durations, result
+
+def route_cases(fixture):
+    """(name, method, urls, options) per benchmarked request; urls are cycled through"""
+    crop_name = fixture['crops'][0]
+    years = fixture['config']['years']
+    gzip_header = {'Accept-Encoding': 'gzip'}
+    # Misspelled names (one letter dropped) take the fuzzy search fallback; a different one per request
+    typos = [name[:3] + name[4:] for name in fixture['names'] if len(name) > 6]
+    zoom = TILE_ZOOMS[1]
+    lng, lat = fixture['tile_point']
+    tile_x = int((lng + 180) / 360 * 2 ** zoom)
+    tile_y = int((1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * 2 ** zoom)
+    bbox = ','.join(str(value) for value in fixture['bbox'])
+    return [
+        ('index', 'GET', ['/'], {}),
+        ('brazilian_states', 'GET', ['/api/brazilian-states'], {}),
+        ('statistics', 'GET', ['/api/statistics'], {}),
+        ('crops', 'GET', ['/api/crops'], {}),
+        ('crop_data', 'GET', [f'/api/crop-data/{crop_name}'], {}),
+        ('crop_data_gzip', 'GET', [f'/api/crop-data/{crop_name}'], {'headers': gzip_header}),
+        ('crop_data_year', 'GET', [f'/api/crop-data/{crop_name}?year={years[0]}'], {}),
+        ('crop_data_ndjson', 'GET', [f'/api/crop-data/{crop_name}?format=ndjson'], {}),
+        ('crop_data_batch', 'POST', ['/api/crop-data/batch'], {'json': {'crops': fixture['crops'][:5]}}),
+        ('crop_chart_data', 'GET', [f'/api/crop-chart-data/{crop_name}'], {}),
+        ('crop_chart_data_state', 'GET', [f'/api/crop-chart-data/{crop_name}?state=MG'], {}),
+        ('crop_chart_data_growth', 'GET', [f'/api/crop-chart-data/{crop_name}?from={years[0]}&to={years[-1]}'], {}),
+        ('years', 'GET', ['/api/years'], {}),
+        ('aggregate', 'GET', ['/api/aggregate?group_by=state'], {}),
+        ('aggregate_crop', 'GET', [f'/api/aggregate?group_by=region&crop={crop_name}&metric=mean'], {}),
+        ('municipality', 'GET', [f'/api/municipality/{fixture["municipality"]}'], {}),
+        ('search_prefix', 'GET', [f'/api/search?q={fixture["municipality_name"][:5]}'], {}),
+        ('search_fuzzy', 'GET', [f'/api/search?q={typo}' for typo in typos], {}),
+        ('crop_trend', 'GET', [f'/api/crop-trend/{crop_name}'], {}),
+        ('boundaries', 'GET', ['/api/boundaries?level=low'], {}),
+        ('boundaries_bbox', 'GET', [f'/api/boundaries?bbox={bbox}'], {}),
+        ('boundaries_state_crop', 'GET', [f'/api/boundaries?state=SP&crop={crop_name}&level=medium'], {}),
+        ('vector_tile', 'GET', [f'/tiles/{zoom}/{tile_x}/{tile_y}.pbf'], {'headers': gzip_header}),
+        ('metrics', 'GET', ['/metrics'], {})
+    ]
+
+def api_failure(response):
+    """Why a benchmarked response is not a real answer (error status or {success: false}), None when it is"""
+    if response.status_code >= 400:
+        return f'HTTP {response.status_code}'
+    if response.mimetype != 'application/json':
+        return None
+    body = response.get_data()
+    if response.headers.get('Content-Encoding') == 'gzip':
+        body = gzip.decompress(body)
+    payload = json.loads(body)
+    if isinstance(payload, dict) and payload.get('success') is False:
+        return payload.get('error')
+    return None
+
+def benchmark_routes(work_dir, fixture, requests_per_route):
+    """Every route through the Flask test client; the body is read, so streamed responses are timed in full"""
+    enter_work_dir(work_dir)
+    from app import app
+    client = app.test_client()
+    client.get('/api/crops').get_data()
+
+    adapter = app.url_map.bind('localhost')
+    covered = set()
+    results = {}
+    for name, method, urls, options in route_cases(fixture):
+        covered.add(adapter.match(urls[0].split('?')[0], method=method)[0])
+
+        def request(i):
+            response = client.open(urls[i % len(urls)], method=method, **options)
+            return response.status_code, len(response.get_data())
+
+        # Timing an error response would hide a broken route behind a fast number
+        failure = api_failure(client.open(urls[0], method=method, **options))
+        if failure:
+            print(f'⚠️ {name}: {failure}')
+        statuses = {}
+        for i in range(1, WARMUP_REQUESTS):
+            request(i)
+        durations = []
+        size = 0
+        started = time.perf_counter()
+        for i in range(WARMUP_REQUESTS, WARMUP_REQUESTS + requests_per_route):
+            request_started = time.perf_counter()
+            status, size = request(i)
+            durations.append(time.perf_counter() - request_started)
+            statuses[status] = statuses.get(status, 0) + 1
+            if time.perf_counter() - started > ROUTE_TIME_LIMIT:
+                break
+        results[f'route:{name}'] = summarize(
+            durations, kind='route', request=f'{method} {urls[0]}', bytes=size, failure=failure,
+            statuses={str(status): count for status, count in sorted(statuses.items())}
+        )
+
+    missing = {rule.endpoint for rule in app.url_map.iter_rules()} - covered - SKIPPED_ENDPOINTS
+    if missing:
+        print(f'⚠️ Rotas sem benchmark: {", ".join(sorted(missing))}')
+    return results, peak_rss_mib()
+
+def benchmark_function(name, work_dir, fixture, runs):
+    """One ingestion/load function, timed over several runs in this (fresh) process"""
+    enter_work_dir(work_dir)
+    result = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        if name == 'load_crop_data':
+            from routes import load_crop_data
+            durations, crop_data = time_runs(load_crop_data, runs)
+            items = sum(len(municipalities) for municipalities in crop_data.values())
+        elif name == 'process_complete_ibge_data':
+            from process_full_ibge_data import process_complete_ibge_data
+            durations, result = time_runs(lambda: process_complete_ibge_data(force=True), runs)
+            items = result.get('records')
+        elif name == 'process_ibge_data':
+            from app import app, db
+            from data_processor import process_ibge_data
+            with app.app_context():
+                db.create_all()
+                durations, result = time_runs(lambda: process_ibge_data(fixture['workbooks']), runs)
+            items = result.get('processed')
+        else:
+            from combine_geojson import combine_geojson_files
+            durations, _ = time_runs(combine_geojson_files, runs)
+            items = fixture['config']['municipalities']
+        if not result.get('success', True):
+            raise RuntimeError(f'{name} falhou: {result.get("error")}')
+    results = summarize(durations, kind='function', items=items)
+    results['items_per_second'] = items / (results['seconds'] / len(durations)) if items else None
+    return {name: results}, peak_rss_mib()
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmarks(work_dir, config, only=None, requests_per_route=ROUTE_REQUESTS, runs=INGEST_RUNS):
+    """Run the selected benchmarks, each in its own process, and return the results document"""
+    work_dir = os.path.abspath(work_dir)
+    fixture = ensure_fixture(work_dir, config)
+    benchmarks = {}
+    # Peak RSS per isolated process (all routes share one), not per benchmark
+    peak_memory = {}
+    for name in only or BENCHMARKS:
+        print(f'▶️ {name}')
+        if name == 'routes':
+            results, peak_memory[name] = run_isolated(benchmark_routes, work_dir, fixture, requests_per_route)
+        else:
+            results, peak_memory[name] = run_isolated(
+                benchmark_function, name, work_dir, fixture, LOAD_RUNS if name == 'load_crop_data' else runs
+            )
+        benchmarks.update(results)
+    return {
+        'version': RESULTS_VERSION,
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'git_commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'fixture': config,
+        'benchmarks': benchmarks,
+        'peak_rss_mib': peak_memory
+    }
+
+def print_results(document):
+    print(f"{'Benchmark':<32} {'Runs':>5} {'p50 ms':>9} {'p99 ms':>9} {'Ops/s':>9}")
+    for name, result in document['benchmarks'].items():
+        print(
+            f"{name:<32} {result['runs']:>5} {result['p50_ms']:>9.2f} {result['p99_ms']:>9.2f}"
+            f" {result['throughput_per_second'] or 0:>9.1f}"
+        )
+    print(f"\n{'Processo':<32} {'Peak MiB':>9}")
+    for name, peak in document['peak_rss_mib'].items():
+        print(f"{name:<32} {f'{peak:.1f}' if peak is not None else '-':>9}")
+
+def change(baseline, current):
+    return (current - baseline) / baseline if baseline else 0.0
+
+def compare_results(baseline, current, threshold=REGRESSION_THRESHOLD):
+    """Per benchmark in both documents: relative changes and the metrics that regressed beyond threshold"""
+    comparison = {}
+    for name in baseline['benchmarks'].keys() & current['benchmarks'].keys():
+        before = baseline['benchmarks'][name]
+        after = current['benchmarks'][name]
+        changes = {
+            'p50_ms': change(before['p50_ms'], after['p50_ms']),
+            'p99_ms': change(before['p99_ms'], after['p99_ms']),
+            'throughput_per_second': change(before['throughput_per_second'] or 0, after['throughput_per_second'] or 0)
+        }
+        regressions = []
+        for metric, limit in (('p50_ms', threshold), ('p99_ms', threshold * P99_THRESHOLD_FACTOR)):
+            if changes[metric] > limit and after[metric] - before[metric] > MIN_LATENCY_DELTA_MS:
+                regressions.append(metric)
+        if changes['throughput_per_second'] < -threshold:
+            regressions.append('throughput_per_second')
+        comparison[name] = {'changes': changes, 'regressions': regressions}
+    return comparison
+
+def compare_memory(baseline, current, threshold=REGRESSION_THRESHOLD):
+    """Peak RSS change per isolated process measured in both documents (skipped where it was not available)"""
+    before_peaks = baseline.get('peak_rss_mib', {})
+    after_peaks = current.get('peak_rss_mib', {})
+    comparison = {}
+    for name in before_peaks.keys() & after_peaks.keys():
+        if before_peaks[name] is None or after_peaks[name] is None:
+            continue
+        peak_change = change(before_peaks[name], after_peaks[name])
+        comparison[name] = {'change': peak_change, 'regression': peak_change > threshold}
+    return comparison
+
+def print_comparison(baseline, current, comparison, memory):
+    if baseline.get('fixture') != current.get('fixture'):
+        print('⚠️ Os resultados usam dados sintéticos diferentes; a comparação pode não ser válida')
+    for label, names in (
+        ('Só no baseline', baseline['benchmarks'].keys() - current['benchmarks'].keys()),
+        ('Novos', current['benchmarks'].keys() - baseline['benchmarks'].keys())
+    ):
+        if names:
+            print(f'{label}: {", ".join(sorted(names))}')
+    print(f"{'Benchmark':<32} {'p50 ms':>19} {'p99':>7} {'Ops/s':>7}")
+    for name in sorted(comparison):
+        changes = comparison[name]['changes']
+        regressions = comparison[name]['regressions']
+        before = baseline['benchmarks'][name]['p50_ms']
+        after = current['benchmarks'][name]['p50_ms']
+        print(
+            f"{name:<32} {before:>8.2f} → {after:>8.2f} {changes['p99_ms']:>+7.0%} {changes['throughput_per_second']:>+7.0%}"
+            f"  {'❌ ' + ', '.join(regressions) if regressions else ''}"
+        )
+    if memory:
+        print(f"\n{'Processo':<32} {'Peak MiB':>19} {'Peak':>7}")
+    for name in sorted(memory):
+        before = baseline['peak_rss_mib'][name]
+        after = current['peak_rss_mib'][name]
+        print(
+            f"{name:<32} {before:>8.1f} → {after:>8.1f} {memory[name]['change']:>+7.0%}"
+            f"  {'❌ peak_rss_mib' if memory[name]['regression'] else ''}"
+        )
+
+def load_results(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def save_results(document, path=None):
+    path = path or f"{RESULTS_DIR}/{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}.json"
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(document, f, ensure_ascii=False, indent=2)
+    return path
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Benchmarks offline das rotas da API e da ingestão com dados sintéticos')
+    commands = parser.add_subparsers(dest='command', required=True)
+    for command in ('run', 'generate'):
+        subparser = commands.add_parser(command)
+        subparser.add_argument('--workdir', default=WORK_DIR)
+        subparser.add_argument('--municipalities', type=int)
+        subparser.add_argument('--crops', type=int)
+        subparser.add_argument('--density', type=float)
+        subparser.add_argument('--seed', type=int)
+    run = commands.choices['run']
+    run.add_argument('--only', help=f'lista separada por vírgulas de: {", ".join(BENCHMARKS)}')
+    run.add_argument('--requests', type=int, default=ROUTE_REQUESTS, help='requisições por rota')
+    run.add_argument('--runs', type=int, default=INGEST_RUNS, help='execuções por benchmark de ingestão')
+    run.add_argument('--output', help=f'arquivo de resultados (padrão: {RESULTS_DIR}/<data>.json)')
+    compare = commands.add_parser('compare')
+    compare.add_argument('baseline')
+    compare.add_argument('current')
+    compare.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD)
+    args = parser.parse_args(argv)
+
+    if args.command == 'compare':
+        baseline, current = load_results(args.baseline), load_results(args.current)
+        comparison = compare_results(baseline, current, args.threshold)
+        memory = compare_memory(baseline, current, args.threshold)
+        print_comparison(baseline, current, comparison, memory)
+        # Non-zero exit status so CI can fail on a regression
+        regressed = any(result['regressions'] for result in comparison.values())
+        return 1 if regressed or any(result['regression'] for result in memory.values()) else 0
+
+    config = fixture_config(args.municipalities, args.crops, args.density, args.seed)
+    if args.command == 'generate':
+        generate_fixture(os.path.abspath(args.workdir), config)
+        return 0
+
+    only = args.only.split(',') if args.only else None
+    unknown = set(only or []) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f'benchmark desconhecido: {", ".join(sorted(unknown))}')
+    document = run_benchmarks(args.workdir, config, only, args.requests, args.runs)
+    print_results(document)
+    print(f'\n💾 Resultados salvos em {save_results(document, args.output)}')
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,177 @@
+import json
+import math
+
+# Property names used by the different municipality GeoJSON sources (same order as map.js)
+CODE_PROPERTIES = ('GEOCODIGO', 'CD_MUN', 'cd_geocmu', 'geocodigo', 'CD_GEOCMU')
+NAME_PROPERTIES = ('NOME', 'NM_MUN', 'nm_mun', 'nome')
+STATE_PROPERTIES = ('UF', 'SIGLA_UF', 'uf')
+
+# The first two digits of an IBGE municipality code identify its state
+IBGE_STATE_PREFIXES = {
+    '11': 'RO', '12': 'AC', '13': 'AM', '14': 'RR', '15': 'PA', '16': 'AP', '17': 'TO',
+    '21': 'MA', '22': 'PI', '23': 'CE', '24': 'RN', '25': 'PB', '26': 'PE', '27': 'AL',
+    '28': 'SE', '29': 'BA', '31': 'MG', '32': 'ES', '33': 'RJ', '35': 'SP', '41': 'PR',
+    '42': 'SC', '43': 'RS', '50': 'MS', '51': 'MT', '52': 'GO', '53': 'DF'
+}
+
+NODE_CAPACITY = 16
+
+def first_property(properties, names):
+    for name in names:
+        value = properties.get(name)
+        if value:
+            return str(value)
+    return None
+
+def iter_positions(coordinates):
+    """Yield every [x, y] position of a (Multi)Point/LineString/Polygon coordinate array"""
+    if coordinates and isinstance(coordinates[0], (int, float)):
+        yield coordinates
+        return
+    for part in coordinates:
+        yield from iter_positions(part)
+
+def geometry_bounds(geometry):
+    """(min_x, min_y, max_x, max_y) of a GeoJSON geometry, None when it is empty"""
+    if not geometry:
+        return None
+    if geometry.get('type') == 'GeometryCollection':
+        parts = [geometry_bounds(part) for part in geometry.get('geometries', [])]
+        parts = [part for part in parts if part]
+        if not parts:
+            return None
+        return union_bounds(parts)
+
+    xs, ys = [], []
+    for position in iter_positions(geometry.get('coordinates') or []):
+        xs.append(position[0])
+        ys.append(position[1])
+    if not xs:
+        return None
+    return min(xs), min(ys), max(xs), max(ys)
+
+def union_bounds(boxes):
+    return (
+        min(box[0] for box in boxes), min(box[1] for box in boxes),
+        max(box[2] for box in boxes), max(box[3] for box in boxes)
+    )
+
+def bounds_intersect(a, b):
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+class STRtree:
+    """Sort-Tile-Recursive packed R-tree over bounding boxes
+
+    Built once; query() returns the ids of every box intersecting the query box.
+    """
+
+    def __init__(self, boxes, node_capacity=NODE_CAPACITY):
+        self.node_capacity = node_capacity
+        # Leaf entries are (box, item_id); inner entries are (box, [child entries])
+        entries = [(box, item_id) for item_id, box in enumerate(boxes) if box]
+        self.root = None
+        is_leaf = True
+        while entries:
+            entries = self._pack(entries, is_leaf)
+            is_leaf = False
+            if len(entries) == 1:
+                self.root = entries[0]
+                break
+
+    def _pack(self, entries, is_leaf):
+        """Group one level of entries into parent nodes, tiled by x then y"""
+        capacity = self.node_capacity
+        node_count = math.ceil(len(entries) / capacity)
+        slab_size = math.ceil(math.sqrt(node_count)) * capacity
+
+        entries = sorted(entries, key=lambda entry: entry[0][0] + entry[0][2])
+        nodes = []
+        for slab_start in range(0, len(entries), slab_size):
+            slab = sorted(entries[slab_start:slab_start + slab_size], key=lambda entry: entry[0][1] + entry[0][3])
+            for start in range(0, len(slab), capacity):
+                children = slab[start:start + capacity]
+                nodes.append((union_bounds([child[0] for child in children]), is_leaf, children))
+        return nodes
+
+    def query(self, box):
+        if self.root is None:
+            return []
+        found = []
+        stack = [self.root]
+        while stack:
+            node_box, is_leaf, children = stack.pop()
+            if not bounds_intersect(node_box, box):
+                continue
+            if is_leaf:
+                found.extend(item_id for child_box, item_id in children if bounds_intersect(child_box, box))
+            else:
+                stack.extend(children)
+        return sorted(found)
+
+class BoundaryIndex:
+    """Municipality boundaries with a spatial index and per-state lists
+
+    Geometries are serialized once at build time; responses are assembled
+    from those strings without re-encoding coordinates.
+    """
+
+    def __init__(self, features):
+        self.codes = []
+        self.names = []
+        self.states = []
+        self.geometries = []
+        boxes = []
+        self.by_state = {}
+
+        for feature in features:
+            properties = feature.get('properties') or {}
+            code = first_property(properties, CODE_PROPERTIES)
+            state_code = first_property(properties, STATE_PROPERTIES)
+            if not state_code and code:
+                state_code = IBGE_STATE_PREFIXES.get(code[:2])
+
+            self.by_state.setdefault(state_code, []).append(len(self.codes))
+            self.codes.append(code)
+            self.names.append(first_property(properties, NAME_PROPERTIES))
+            self.states.append(state_code)
+            self.geometries.append(json.dumps(feature.get('geometry'), separators=(',', ':')))
+            boxes.append(geometry_bounds(feature.get('geometry')))
+
+        self.tree = STRtree(boxes)
+
+    @classmethod
+    def from_geojson(cls, geojson_path):
+        with open(geojson_path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f).get('features', []))
+
+    def __len__(self):
+        return len(self.codes)
+
+    def query(self, bbox=None, state=None):
+        """Ids of the features intersecting bbox and/or belonging to state"""
+        if bbox is None:
+            if state:
+                return self.by_state.get(state, [])
+            return range(len(self.codes))
+
+        feature_ids = self.tree.query(bbox)
+        if state:
+            feature_ids = [feature_id for feature_id in feature_ids if self.states[feature_id] == state]
+        return feature_ids
+
+    def feature_collection_json(self, feature_ids, areas_by_code=None):
+        """Serialize the selected features as a FeatureCollection with harvested areas joined in"""
+        areas_by_code = areas_by_code or {}
+        features = []
+        for feature_id in feature_ids:
+            code = self.codes[feature_id]
+            properties = json.dumps({
+                'municipality_code': code,
+                'municipality_name': self.names[feature_id],
+                'state_code': self.states[feature_id],
+                'harvested_area': areas_by_code.get(code)
+            }, ensure_ascii=False, separators=(',', ':'))
+            features.append(
+                f'{{"type":"Feature","geometry":{self.geometries[feature_id]},"properties":{properties}}}'
+            )
+        return '{"success":true,"type":"FeatureCollection","features":[' + ','.join(features) + ']}\n'
@@ -0,0 +1,38 @@
+import threading
+from metrics import CACHE_REQUESTS
+
+_MISSING = object()
+
+class BoundedCache:
+    """Values built on first use and shared by all request threads, with FIFO eviction past max_size
+
+    Lookups, inserts and eviction run under a lock; values are built outside it,
+    so two threads missing the same key at once may both build it (the first
+    stored value wins). Hits and misses are counted in cache_requests_total.
+    """
+
+    def __init__(self, name, max_size=None):
+        self.name = name
+        self.max_size = max_size
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._values)
+
+    def get(self, key, build):
+        with self._lock:
+            value = self._values.get(key, _MISSING)
+        if value is not _MISSING:
+            CACHE_REQUESTS.inc(cache=self.name, result='hit')
+            return value
+
+        CACHE_REQUESTS.inc(cache=self.name, result='miss')
+        value = build()
+        with self._lock:
+            if key in self._values:
+                return self._values[key]
+            if self.max_size is not None and len(self._values) >= self.max_size:
+                self._values.pop(next(iter(self._values)))
+            self._values[key] = value
+        return value
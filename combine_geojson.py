@@ -1,10 +1,133 @@
+import hashlib
+import itertools
 import json
 import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from topology import Topology, write_json
 
-def combine_geojson_files():
-    """Combine multiple state GeoJSON files into one"""
-    combined_features = []
+# Simplified output levels: (name, Douglas-Peucker tolerance in degrees, decimal places)
+SIMPLIFICATION_LEVELS = [
+    ('full', 0, 5),
+    ('high', 0.0005, 5),
+    ('medium', 0.002, 4),
+    ('low', 0.01, 3)
+]
+
+# Content hashes of the state files the combined output was last built from
+SOURCE_HASHES_FILE = 'static/data/brazil_municipalities_sources.json'
+
+def count_vertices(features):
+    total = 0
+    for feature in features:
+        geometry = feature.get('geometry') or {}
+        polygons = [geometry['coordinates']] if geometry.get('type') == 'Polygon' else geometry.get('coordinates', [])
+        total += sum(len(ring) for polygon in polygons for ring in polygon)
+    return total
+
+def build_simplified_levels(topology, output_dir='static/data'):
+    """Write topology-preserving simplified GeoJSON and TopoJSON levels and report their sizes"""
+    print(f"Topology: {len(topology.arcs)} arcs for {len(topology.properties)} municipalities")
+    
+    levels = {}
+    for name, tolerance, decimals in SIMPLIFICATION_LEVELS:
+        arcs = topology.simplified_arcs(tolerance)
+        
+        # Both files are streamed feature by feature; no level is held in memory as a whole.
+        # Each is replaced in one step, since the web workers reload a level as soon as it changes.
+        geojson_path = f'{output_dir}/brazil_municipalities_{name}.geojson'
+        with open(f"{geojson_path}.tmp", 'w', encoding='utf-8') as f:
+            geojson_vertices = count_vertices(
+                write_feature_collection(topology.iter_geojson_features(arcs, decimals), f)
+            )
+        os.replace(f"{geojson_path}.tmp", geojson_path)
+        topojson_path = f'{output_dir}/brazil_municipalities_{name}.topojson'
+        with open(f"{topojson_path}.tmp", 'w', encoding='utf-8') as f:
+            topology.write_topojson(arcs, decimals, f)
+        os.replace(f"{topojson_path}.tmp", topojson_path)
+        levels[name] = {
+            'tolerance': tolerance,
+            'decimals': decimals,
+            'geojson': os.path.basename(geojson_path),
+            'geojson_bytes': os.path.getsize(geojson_path),
+            'geojson_vertices': geojson_vertices,
+            'topojson': os.path.basename(topojson_path),
+            'topojson_bytes': os.path.getsize(topojson_path),
+            'topojson_vertices': topology.vertex_count(arcs)
+        }
     
+    # Manifest so clients can pick the level that fits their zoom
+    write_json(levels, f'{output_dir}/brazil_municipalities_levels.json')
+    
+    print(f"{'Level':<8} {'Tolerance':>10} {'GeoJSON KB':>11} {'Vertices':>10} {'TopoJSON KB':>12} {'Arc vertices':>13}")
+    for name, level in levels.items():
+        print(
+            f"{name:<8} {level['tolerance']:>10} {level['geojson_bytes'] / 1024:>11.1f} {level['geojson_vertices']:>10}"
+            f" {level['topojson_bytes'] / 1024:>12.1f} {level['topojson_vertices']:>13}"
+        )
+    return levels
+
+def read_state_features(file_path):
+    """Parse one state GeoJSON file (runs in a worker process)"""
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return data.get('features'), None
+    except Exception as e:
+        return None, str(e)
+
+def iter_state_features(state_paths, workers=None):
+    """Yield every feature of the state files, in state order, parsing them in a process pool
+
+    At most one window of parsed states is held at a time, so the parsed
+    GeoJSON of the whole country is never in memory at once (the Topology
+    built from the features still keeps every quantized ring and its properties).
+    """
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        states = iter(state_paths.items())
+        for state, file_path in itertools.islice(states, workers):
+            pending.append((state, file_path, executor.submit(read_state_features, file_path)))
+        while pending:
+            state, file_path, future = pending.popleft()
+            for next_state, next_path in itertools.islice(states, 1):
+                pending.append((next_state, next_path, executor.submit(read_state_features, next_path)))
+
+            features, error = future.result()
+            if error:
+                print(f"Error reading {file_path}: {error}")
+            elif features is not None:
+                print(f"Added {len(features)} municipalities from {state}")
+                yield from features
+
+def write_feature_collection(features, f):
+    """Write features to f as a FeatureCollection one at a time, yielding each after it is written"""
+    f.write('{"type":"FeatureCollection","features":[')
+    for index, feature in enumerate(features):
+        if index:
+            f.write(',')
+        f.write(json.dumps(feature, ensure_ascii=False, separators=(',', ':')))
+        yield feature
+    f.write(']}')
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def load_source_hashes():
+    try:
+        with open(SOURCE_HASHES_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def combine_geojson_files(changed_only=False, workers=None):
+    """Combine multiple state GeoJSON files into one"""
     # All Brazilian states
     states = [
         'AC', 'AL', 'AP', 'AM', 'BA', 'CE', 'DF', 'ES', 'GO', 
@@ -12,32 +135,33 @@ def combine_geojson_files():
         'RJ', 'RN', 'RS', 'RO', 'RR', 'SC', 'SP', 'SE', 'TO'
     ]
     
+    state_paths = {}
     for state in states:
         file_path = f'static/data/{state}.geojson'
         if os.path.exists(file_path):
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    if 'features' in data:
-                        combined_features.extend(data['features'])
-                        print(f"Added {len(data['features'])} municipalities from {state}")
-            except Exception as e:
-                print(f"Error reading {file_path}: {e}")
+            state_paths[state] = file_path
         else:
             print(f"File not found: {file_path}")
     
-    # Create combined GeoJSON
-    combined_geojson = {
-        "type": "FeatureCollection",
-        "features": combined_features
-    }
-    
-    # Save combined file
+    # Skip the rebuild when every state file has the same content as last time
+    source_hashes = {state: file_hash(file_path) for state, file_path in state_paths.items()}
     output_path = 'static/data/brazil_municipalities_all.geojson'
-    with open(output_path, 'w', encoding='utf-8') as f:
-        json.dump(combined_geojson, f, ensure_ascii=False, separators=(',', ':'))
+    if changed_only and os.path.exists(output_path) and load_source_hashes() == source_hashes:
+        print("No state file changed; skipping rebuild")
+        return False
+    
+    # Stream the combined file while the topology is built from the same features
+    temp_path = f"{output_path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        features = write_feature_collection(iter_state_features(state_paths, workers), f)
+        topology = Topology(features, decimals=SIMPLIFICATION_LEVELS[0][2])
+    os.replace(temp_path, output_path)
+    
+    print(f"Combined {len(topology.properties)} municipalities from all Brazil saved to {output_path}")
     
-    print(f"Combined {len(combined_features)} municipalities from all Brazil saved to {output_path}")
+    build_simplified_levels(topology)
+    write_json(source_hashes, SOURCE_HASHES_FILE)
+    return True
 
 if __name__ == "__main__":
-    combine_geojson_files()
\ No newline at end of file
+    combine_geojson_files(changed_only='--changed-only' in sys.argv[1:])
@@ -0,0 +1,256 @@
+from crop_store import is_municipality_code
+
+DEFAULT_CHART_LIMIT = 20
+
+# IBGE macro-regions by state
+STATE_REGIONS = {
+    'AC': 'Norte', 'AM': 'Norte', 'AP': 'Norte', 'PA': 'Norte', 'RO': 'Norte', 'RR': 'Norte', 'TO': 'Norte',
+    'AL': 'Nordeste', 'BA': 'Nordeste', 'CE': 'Nordeste', 'MA': 'Nordeste', 'PB': 'Nordeste',
+    'PE': 'Nordeste', 'PI': 'Nordeste', 'RN': 'Nordeste', 'SE': 'Nordeste',
+    'DF': 'Centro-Oeste', 'GO': 'Centro-Oeste', 'MS': 'Centro-Oeste', 'MT': 'Centro-Oeste',
+    'ES': 'Sudeste', 'MG': 'Sudeste', 'RJ': 'Sudeste', 'SP': 'Sudeste',
+    'PR': 'Sul', 'RS': 'Sul', 'SC': 'Sul'
+}
+
+AGGREGATE_GROUPS = ('state', 'region', 'mesoregion', 'crop')
+AGGREGATE_METRICS = ('sum', 'mean', 'count', 'share')
+
+def build_ranking(entries):
+    """Sort (label, harvested_area) entries by area and split them into chart columns"""
+    ranked = sorted(entries, key=lambda entry: entry[1], reverse=True)
+    return {
+        'labels': [label for label, _ in ranked],
+        'data': [harvested_area for _, harvested_area in ranked]
+    }
+
+def build_crop_rankings(store):
+    """Build per-crop (and per-crop, per-state) rankings sorted by harvested area"""
+    rankings = {}
+    for crop_name in store.crop_names():
+        entries = []
+        entries_by_state = {}
+        for _, municipality_name, state_code, harvested_area in store.iter_records(crop_name):
+            entry = (f"{municipality_name} ({state_code})", harvested_area)
+            entries.append(entry)
+            entries_by_state.setdefault(state_code, []).append(entry)
+
+        ranking = build_ranking(entries)
+        ranking['states'] = {
+            state_code: build_ranking(state_entries)
+            for state_code, state_entries in entries_by_state.items()
+        }
+        rankings[crop_name] = ranking
+    return rankings
+
+def slice_ranking(ranking, limit=DEFAULT_CHART_LIMIT, offset=0, state=None):
+    """Return the chart data for one window of a crop ranking"""
+    if state:
+        ranking = ranking['states'].get(state, {'labels': [], 'data': []})
+    return {
+        key: values[offset:offset + limit]
+        for key, values in ranking.items() if key != 'states'
+    }
+
+def build_crop_trends(stores):
+    """Per-crop time series over {year: store}: total area, municipalities and year-over-year change
+
+    Totals and counts come from municipality rows only.
+    """
+    trends = {}
+    for year in sorted(stores):
+        store = stores[year]
+        for crop_name in store.crop_names():
+            ids, areas = store.municipality_columns(crop_name)
+            trend = trends.setdefault(crop_name, {'years': [], 'total_area': [], 'municipalities': []})
+            trend['years'].append(year)
+            trend['total_area'].append(sum(areas))
+            trend['municipalities'].append(len(ids))
+
+    # Change from the previous year with data for the crop
+    for trend in trends.values():
+        totals = trend['total_area']
+        trend['delta'] = [None] + [current - previous for previous, current in zip(totals, totals[1:])]
+        trend['growth'] = [None] + [
+            (current - previous) / previous * 100 if previous else None
+            for previous, current in zip(totals, totals[1:])
+        ]
+    return trends
+
+def slice_trend(trend, first_year=None, last_year=None):
+    """The part of a crop trend between two years (inclusive)"""
+    keep = [
+        i for i, year in enumerate(trend['years'])
+        if (first_year is None or year >= first_year) and (last_year is None or year <= last_year)
+    ]
+    return {key: [values[i] for i in keep] for key, values in trend.items()}
+
+def build_growth_entries_ranking(entries):
+    """Sort (label, delta, growth %) entries by delta and split them into chart columns"""
+    ranked = sorted(entries, key=lambda entry: entry[1], reverse=True)
+    return {
+        'labels': [label for label, _, _ in ranked],
+        'data': [delta for _, delta, _ in ranked],
+        'growth': [growth for _, _, growth in ranked]
+    }
+
+def build_growth_ranking(from_store, to_store, crop_name):
+    """Municipalities ranked by the change in harvested area of one crop between two years"""
+    before = from_store.crop_areas(crop_name) if crop_name in from_store else {}
+    labels = {}
+    for store in (from_store, to_store):
+        if crop_name in store:
+            for municipality_code, municipality_name, state_code, _ in store.iter_records(crop_name):
+                # Regional total rows are not ranked (their areas would also be counted twice)
+                if is_municipality_code(municipality_code):
+                    labels[municipality_code] = (f"{municipality_name} ({state_code})", state_code)
+    after = to_store.crop_areas(crop_name) if crop_name in to_store else {}
+
+    entries = []
+    entries_by_state = {}
+    for municipality_code, (label, state_code) in labels.items():
+        previous = before.get(municipality_code, 0)
+        delta = after.get(municipality_code, 0) - previous
+        entry = (label, delta, delta / previous * 100 if previous else None)
+        entries.append(entry)
+        entries_by_state.setdefault(state_code, []).append(entry)
+
+    ranking = build_growth_entries_ranking(entries)
+    ranking['states'] = {
+        state_code: build_growth_entries_ranking(state_entries)
+        for state_code, state_entries in entries_by_state.items()
+    }
+    return ranking
+
+def build_statistics(store):
+    """Compute dataset-wide statistics once per data load, from municipality rows only"""
+    municipalities_by_state = {}
+    records_by_state = {}
+    hectares_by_crop = {}
+    total_records = 0
+
+    for crop_name in store.crop_names():
+        ids, areas = store.municipality_columns(crop_name)
+        total_records += len(ids)
+        hectares_by_crop[crop_name] = sum(areas)
+        for municipality_id in ids:
+            state_code = store.states[municipality_id]
+            municipalities_by_state.setdefault(state_code, set()).add(store.codes[municipality_id])
+            records_by_state[state_code] = records_by_state.get(state_code, 0) + 1
+
+    return {
+        'total_crops': len(store),
+        'total_municipalities': store.municipality_count(),
+        'total_records': total_records,
+        'hectares_by_crop': hectares_by_crop,
+        'states': {
+            state_code: {
+                'municipalities': len(codes),
+                'records': records_by_state[state_code]
+            }
+            for state_code, codes in sorted(municipalities_by_state.items())
+        }
+    }
+
+def build_metric_rankings(totals, counts):
+    """Chart columns for every aggregate metric of {group: total area} and {group: record count}"""
+    grand_total = sum(totals.values())
+    return {
+        'sum': build_ranking(totals.items()),
+        'mean': build_ranking((group, total / counts[group]) for group, total in totals.items()),
+        'count': build_ranking(counts.items()),
+        'share': build_ranking(
+            (group, total / grand_total * 100 if grand_total else 0) for group, total in totals.items()
+        )
+    }
+
+def build_aggregates(store, mesoregions=None):
+    """Harvested area by state, region, mesoregion and crop, for each crop and for all crops (key None)
+
+    Returns {group_by: {crop_name or None: {metric: chart columns}}}; mesoregion is
+    only built when a {municipality_code: mesoregion} mapping is given. Only
+    municipality rows are counted, not the regional totals of the sheet.
+    """
+    group_of = {
+        'state': list(store.states),
+        'region': [STATE_REGIONS.get(state_code, 'Desconhecida') for state_code in store.states]
+    }
+    if mesoregions:
+        group_of['mesoregion'] = [
+            f"{mesoregions.get(code, 'Desconhecida')} ({state_code})"
+            for code, state_code in zip(store.codes, store.states)
+        ]
+
+    aggregates = {group_by: {} for group_by in group_of}
+    all_totals = {group_by: {} for group_by in group_of}
+    all_counts = {group_by: {} for group_by in group_of}
+    crop_totals = {}
+    crop_counts = {}
+
+    for crop_name in store.crop_names():
+        ids, areas = store.municipality_columns(crop_name)
+        crop_totals[crop_name] = sum(areas)
+        crop_counts[crop_name] = len(ids)
+        for group_by, groups in group_of.items():
+            totals = {}
+            counts = {}
+            for municipality_id, harvested_area in zip(ids, areas):
+                group = groups[municipality_id]
+                totals[group] = totals.get(group, 0) + harvested_area
+                counts[group] = counts.get(group, 0) + 1
+            aggregates[group_by][crop_name] = build_metric_rankings(totals, counts)
+
+            # All crops together: sum the per-crop groups instead of walking the records again
+            for group, total in totals.items():
+                all_totals[group_by][group] = all_totals[group_by].get(group, 0) + total
+                all_counts[group_by][group] = all_counts[group_by].get(group, 0) + counts[group]
+
+    for group_by in group_of:
+        aggregates[group_by][None] = build_metric_rankings(all_totals[group_by], all_counts[group_by])
+    aggregates['crop'] = {
+        crop_name: build_metric_rankings({crop_name: total}, {crop_name: crop_counts[crop_name]})
+        for crop_name, total in crop_totals.items()
+    }
+    aggregates['crop'][None] = build_metric_rankings(crop_totals, crop_counts)
+    return aggregates
+
+def build_municipality_profiles(store):
+    """Inverted index: municipality code -> its crops by area, with the rank in its state for each crop"""
+    crops_by_id = {}
+    for crop_name in store.crop_names():
+        # Regional total rows get no profile and take no place in the state ranks
+        ids, areas = store.municipality_columns(crop_name)
+        by_state = {}
+        for municipality_id, harvested_area in zip(ids, areas):
+            by_state.setdefault(store.states[municipality_id], []).append((harvested_area, municipality_id))
+        for entries in by_state.values():
+            # Same order as the municipalities of the per-state chart rankings (ties keep record order)
+            entries.sort(key=lambda entry: entry[0], reverse=True)
+            for rank, (harvested_area, municipality_id) in enumerate(entries, 1):
+                crops_by_id.setdefault(municipality_id, []).append(
+                    (crop_name, harvested_area, rank, len(entries))
+                )
+
+    profiles = {}
+    for municipality_id, crops in crops_by_id.items():
+        profile = profiles.setdefault(store.codes[municipality_id], {
+            'municipality_name': store.names[municipality_id],
+            'state_code': store.states[municipality_id],
+            'crops': []
+        })
+        profile['crops'].extend(crops)
+
+    for profile in profiles.values():
+        crops = sorted(profile['crops'], key=lambda crop: crop[1], reverse=True)
+        total_area = sum(harvested_area for _, harvested_area, _, _ in crops)
+        profile['total_area'] = total_area
+        profile['crops'] = [
+            {
+                'crop': crop_name,
+                'harvested_area': harvested_area,
+                'share': harvested_area / total_area * 100 if total_area else 0,
+                'state_rank': rank,
+                'state_municipalities': municipalities
+            }
+            for crop_name, harvested_area, rank, municipalities in crops
+        ]
+    return profiles
@@ -0,0 +1,224 @@
+import mmap
+import os
+import struct
+from array import array
+from boundary_index import IBGE_STATE_PREFIXES
+
+# Binary snapshot layout (little-endian, sections 8-byte aligned):
+#   header | string offsets uint32[S + 1] | string blob | crop table uint32[2 * C]
+#   | municipality ids int32[R] | harvested areas float64[R]
+# Strings are the municipality codes, names and states (M each) then crop names (C).
+SNAPSHOT_MAGIC = b'CROPSNP1'
+SNAPSHOT_VERSION = 1
+SNAPSHOT_HEADER = struct.Struct('<8sIqqIIIQ')
+
+def is_municipality_code(code):
+    """True for a 7-digit IBGE municipality code (the sheets also have mesoregion and microregion total rows)"""
+    return len(code) == 7 and code[:2] in IBGE_STATE_PREFIXES
+
+def _align(offset):
+    return (offset + 7) & ~7
+
+def _snapshot_sections(municipality_count, crop_count, record_count, blob_size):
+    """Byte offsets of each snapshot section"""
+    string_count = 3 * municipality_count + crop_count
+    offsets = _align(SNAPSHOT_HEADER.size)
+    blob = _align(offsets + 4 * (string_count + 1))
+    crop_table = _align(blob + blob_size)
+    ids = _align(crop_table + 8 * crop_count)
+    areas = _align(ids + 4 * record_count)
+    return offsets, blob, crop_table, ids, areas
+
+def _source_signature(source_path):
+    """(size, mtime_ns) of the JSON file a snapshot was built from"""
+    stat = os.stat(source_path)
+    return stat.st_size, stat.st_mtime_ns
+
+def snapshot_is_current(snapshot_path, source_path):
+    """True when the snapshot exists and was built from the current JSON file"""
+    try:
+        with open(snapshot_path, 'rb') as f:
+            header = f.read(SNAPSHOT_HEADER.size)
+        magic, version, source_size, source_mtime_ns = SNAPSHOT_HEADER.unpack(header)[:4]
+        return (
+            magic == SNAPSHOT_MAGIC and version == SNAPSHOT_VERSION
+            and (source_size, source_mtime_ns) == _source_signature(source_path)
+        )
+    except (OSError, struct.error):
+        return False
+
+class CropStore:
+    """Read-only columnar store of harvested areas by crop and municipality
+
+    Municipalities (code, name, state) are interned once in a shared table;
+    each crop keeps two parallel columns: municipality ids and harvested areas.
+    """
+
+    def __init__(self, codes, names, states, crops, buffer=None):
+        self.codes = codes
+        self.names = names
+        self.states = states
+        self._crops = crops
+        # Per municipality id: False for the regional total rows, which must not be counted again
+        self.is_municipality = [is_municipality_code(code) for code in codes]
+        # Keeps the snapshot mapping alive while the columns point into it
+        self._buffer = buffer
+
+    @classmethod
+    def from_crop_data(cls, crop_data):
+        """Build a store from the {crop: {municipality_code: data}} JSON layout"""
+        codes, names, states = [], [], []
+        municipality_ids = {}
+        crops = {}
+
+        for crop_name, municipalities in crop_data.items():
+            ids = array('i')
+            areas = array('d')
+            for municipality_code, municipality_data in municipalities.items():
+                key = (
+                    municipality_code,
+                    municipality_data.get('municipality_name', 'Desconhecido'),
+                    municipality_data.get('state_code', 'XX')
+                )
+                municipality_id = municipality_ids.get(key)
+                if municipality_id is None:
+                    municipality_id = municipality_ids[key] = len(codes)
+                    codes.append(key[0])
+                    names.append(key[1])
+                    states.append(key[2])
+                ids.append(municipality_id)
+                areas.append(municipality_data.get('harvested_area', 0))
+            crops[crop_name] = (ids, areas)
+
+        return cls(codes, names, states, crops)
+
+    @classmethod
+    def from_snapshot(cls, snapshot_path):
+        """Map a binary snapshot read-only; the columns are views into the page cache"""
+        with open(snapshot_path, 'rb') as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(buffer)
+
+        magic, version, _, _, municipality_count, crop_count, record_count, blob_size = (
+            SNAPSHOT_HEADER.unpack_from(view)
+        )
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            raise ValueError(f"Snapshot inválido: {snapshot_path}")
+
+        offsets_at, blob_at, crop_table_at, ids_at, areas_at = _snapshot_sections(
+            municipality_count, crop_count, record_count, blob_size
+        )
+        string_count = 3 * municipality_count + crop_count
+        string_offsets = view[offsets_at:offsets_at + 4 * (string_count + 1)].cast('I')
+        blob = view[blob_at:blob_at + blob_size]
+        strings = [
+            str(blob[string_offsets[i]:string_offsets[i + 1]], 'utf-8')
+            for i in range(string_count)
+        ]
+
+        crop_table = view[crop_table_at:crop_table_at + 8 * crop_count].cast('I')
+        ids = view[ids_at:ids_at + 4 * record_count].cast('i')
+        areas = view[areas_at:areas_at + 8 * record_count].cast('d')
+
+        crops = {}
+        crop_names = strings[3 * municipality_count:]
+        for i, crop_name in enumerate(crop_names):
+            start, count = crop_table[2 * i], crop_table[2 * i + 1]
+            crops[crop_name] = (ids[start:start + count], areas[start:start + count])
+
+        return cls(
+            strings[:municipality_count],
+            strings[municipality_count:2 * municipality_count],
+            strings[2 * municipality_count:3 * municipality_count],
+            crops,
+            buffer
+        )
+
+    def write_snapshot(self, snapshot_path, source_path):
+        """Write the store as a binary snapshot tied to the JSON file it mirrors"""
+        crop_names = self.crop_names()
+        strings = [s.encode('utf-8') for s in self.codes + self.names + self.states + crop_names]
+        string_offsets = array('I', [0])
+        for encoded in strings:
+            string_offsets.append(string_offsets[-1] + len(encoded))
+        blob = b''.join(strings)
+
+        crop_table = array('I')
+        ids = array('i')
+        areas = array('d')
+        for crop_name in crop_names:
+            crop_ids, crop_areas = self._crops[crop_name]
+            crop_table.extend((len(ids), len(crop_ids)))
+            ids.extend(crop_ids)
+            areas.extend(crop_areas)
+
+        sections = _snapshot_sections(len(self.codes), len(crop_names), len(ids), len(blob))
+        source_size, source_mtime_ns = _source_signature(source_path)
+        header = SNAPSHOT_HEADER.pack(
+            SNAPSHOT_MAGIC, SNAPSHOT_VERSION, source_size, source_mtime_ns,
+            len(self.codes), len(crop_names), len(ids), len(blob)
+        )
+
+        # Write to a temporary file and rename, so running workers keep their old mapping
+        temp_path = f"{snapshot_path}.tmp"
+        with open(temp_path, 'wb') as f:
+            for offset, data in zip((0,) + sections, (header, string_offsets, blob, crop_table, ids, areas)):
+                f.write(b'\0' * (offset - f.tell()))
+                f.write(data)
+        os.replace(temp_path, snapshot_path)
+
+    def __contains__(self, crop_name):
+        return crop_name in self._crops
+
+    def __len__(self):
+        return len(self._crops)
+
+    def crop_names(self):
+        """Crop names in load order"""
+        return list(self._crops)
+
+    def municipality_count(self):
+        """Number of distinct municipalities in the store (regional total rows excluded)"""
+        return len({code for code, is_municipality in zip(self.codes, self.is_municipality) if is_municipality})
+
+    def crop_columns(self, crop_name):
+        """(municipality ids, harvested areas) columns of one crop"""
+        return self._crops[crop_name]
+
+    def municipality_columns(self, crop_name):
+        """(municipality ids, harvested areas) of one crop without the regional total rows"""
+        ids, areas = self._crops[crop_name]
+        is_municipality = self.is_municipality
+        kept = [
+            (municipality_id, area) for municipality_id, area in zip(ids, areas) if is_municipality[municipality_id]
+        ]
+        return [municipality_id for municipality_id, _ in kept], [area for _, area in kept]
+
+    def crop_size(self, crop_name):
+        """Number of municipalities with data for one crop"""
+        return len(self._crops[crop_name][0])
+
+    def iter_records(self, crop_name):
+        """Yield (code, name, state, harvested_area) for every municipality of a crop"""
+        ids, areas = self._crops[crop_name]
+        codes, names, states = self.codes, self.names, self.states
+        for municipality_id, harvested_area in zip(ids, areas):
+            yield codes[municipality_id], names[municipality_id], states[municipality_id], harvested_area
+
+    def crop_areas(self, crop_name):
+        """{municipality_code: harvested_area} of one crop"""
+        ids, areas = self._crops[crop_name]
+        codes = self.codes
+        return {codes[municipality_id]: harvested_area for municipality_id, harvested_area in zip(ids, areas)}
+
+    def crop_mapping(self, crop_name, state=None):
+        """Rebuild the {municipality_code: data} mapping of one crop, optionally for one state only"""
+        return {
+            municipality_code: {
+                'municipality_name': municipality_name,
+                'state_code': state_code,
+                'harvested_area': harvested_area
+            }
+            for municipality_code, municipality_name, state_code, harvested_area in self.iter_records(crop_name)
+            if state is None or state_code == state
+        }
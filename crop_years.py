@@ -0,0 +1,59 @@
+import json
+import os
+from crop_store import CropStore
+from profiling import stage
+
+# One crop dataset (JSON + binary snapshot) per harvest year, plus an index of the years present
+YEARS_DIR = 'data/years'
+YEARS_INDEX_FILE = 'data/years/index.json'
+
+# Year assumed for workbooks whose file name has none
+DEFAULT_YEAR = 2023
+
+def year_data_file(year):
+    return f'{YEARS_DIR}/crop_data_{year}.json'
+
+def year_snapshot_file(year):
+    return f'{YEARS_DIR}/crop_data_{year}.bin'
+
+def year_files(year):
+    return [year_data_file(year), year_snapshot_file(year)]
+
+def write_year_dataset(year, crop_data):
+    """Write one year's {crop: {municipality_code: data}} as JSON plus its binary snapshot"""
+    with stage('serialize'):
+        text = json.dumps(crop_data, ensure_ascii=False, separators=(',', ':'))
+        store = CropStore.from_crop_data(crop_data)
+    with stage('write'):
+        os.makedirs(YEARS_DIR, exist_ok=True)
+        data_file = year_data_file(year)
+        temp_path = f"{data_file}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(temp_path, data_file)
+        store.write_snapshot(year_snapshot_file(year), data_file)
+
+def read_year_dataset(year):
+    with open(year_data_file(year), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def remove_year_dataset(year):
+    for path in year_files(year):
+        if os.path.exists(path):
+            os.remove(path)
+
+def write_years_index(years):
+    """Publish the list of available years; written last so readers never see a missing year"""
+    os.makedirs(YEARS_DIR, exist_ok=True)
+    temp_path = f"{YEARS_INDEX_FILE}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump({'years': sorted(years), 'latest': max(years) if years else None}, f)
+    os.replace(temp_path, YEARS_INDEX_FILE)
+
+def read_years_index():
+    """Sorted list of the years with a dataset, empty when none was built"""
+    try:
+        with open(YEARS_INDEX_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f).get('years', [])
+    except (OSError, ValueError):
+        return []
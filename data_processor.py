@@ -1,103 +1,300 @@
 import pandas as pd
+import csv
+import io
 import json
 import os
 import logging
+from itertools import islice
 from app import db
-from models import CropData, ProcessingLog
+from models import Crop, CropData, Municipality, ProcessingLog, State
+from process_full_ibge_data import (
+    AREA_PLACEHOLDERS, clean_area_values, municipality_codes, source_year, split_municipality_info
+)
+from crop_years import DEFAULT_YEAR
+from excel_reader import read_first_sheet
+from sqlalchemy import Column, Index, MetaData, inspect, select, text
+from sqlalchemy.sql.visitors import replacement_traverse
 from sqlalchemy.exc import IntegrityError
 
 logger = logging.getLogger(__name__)
 
-def process_ibge_data(excel_path):
-    """Process IBGE Excel data and store in database"""
+# Bulk load settings: rows per COPY/executemany batch and the staging table name
+BULK_BATCH_SIZE = 10000
+STAGING_TABLE = "crop_data_staging"
+RECORD_COLUMNS = ["municipality_code", "municipality_name", "state_code", "crop_name", "harvested_area", "year"]
+# Columns of the narrow crop_data fact table
+FACT_COLUMNS = ["crop_id", "year", "municipality_id", "harvested_area"]
+
+def build_crop_records(df, year=DEFAULT_YEAR):
+    """Clean the wide IBGE sheet of one year into (long DataFrame of CropData rows, rejected cell count)"""
+    codes = df.iloc[:, 0]
+    infos = df.iloc[:, 1]
+    crop_columns = list(df.columns[2:])
+    
+    wide_df = df[crop_columns].copy()
+    municipality_name, state_code = split_municipality_info(infos.where(infos.notna(), "Unknown").astype(str))
+    # Same 7-digit codes as the JSON files, so both sources answer with the same keys
+    wide_df.insert(0, "municipality_code", municipality_codes(codes.astype(str).where(codes.notna(), "0")))
+    wide_df.insert(1, "municipality_name", municipality_name)
+    wide_df.insert(2, "state_code", state_code)
+    
+    long_df = wide_df.melt(
+        id_vars=["municipality_code", "municipality_name", "state_code"],
+        value_vars=crop_columns,
+        var_name="crop_name",
+        value_name="harvested_area"
+    )
+    raw_areas = long_df["harvested_area"]
+    long_df["harvested_area"] = clean_area_values(raw_areas)
+    long_df["year"] = year
+    
+    # Cells with a value that is neither a "no data" placeholder nor a positive area
+    rejected = raw_areas.notna() & ~raw_areas.isin(AREA_PLACEHOLDERS) & long_df["harvested_area"].isna()
+    return long_df.dropna(subset=["harvested_area"]), int(rejected.sum())
+
+def iter_record_batches(facts_df, batch_size=BULK_BATCH_SIZE):
+    """Yield lists of fact row dicts, batch_size at a time"""
+    rows = facts_df[FACT_COLUMNS].itertuples(index=False, name=None)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            break
+        yield [dict(zip(FACT_COLUMNS, row)) for row in batch]
+
+def upsert_dimension(connection, table, key_column, rows):
+    """Insert dimension rows whose key is new, update changed ones; return {key: id}"""
+    existing = {row[0]: row[1:] for row in connection.execute(
+        select(table.c[key_column], table.c.id, *[table.c[column] for column in rows[0] if column != key_column])
+    )} if rows else {}
+    new_rows = [row for row in rows if row[key_column] not in existing]
+    changed_rows = [
+        dict(row, id=existing[row[key_column]][0]) for row in rows
+        if row[key_column] in existing and tuple(row[column] for column in row if column != key_column) != existing[row[key_column]][1:]
+    ]
+    if new_rows:
+        connection.execute(table.insert(), new_rows)
+    for row in changed_rows:
+        connection.execute(table.update().where(table.c.id == row['id']).values(
+            {column: value for column, value in row.items() if column not in ('id', key_column)}
+        ))
+    return dict(connection.execute(select(table.c[key_column], table.c.id)).all())
+
+def attach_dimension_keys(connection, records_df):
+    """Upsert the states, crops and municipalities of the records and map them to fact rows"""
+    state_ids = upsert_dimension(
+        connection, State.__table__, "code",
+        [{"code": code} for code in records_df["state_code"].unique()]
+    )
+    crop_ids = upsert_dimension(
+        connection, Crop.__table__, "name",
+        [{"name": name} for name in records_df["crop_name"].unique()]
+    )
+    # A municipality takes the name and state of its latest record
+    municipalities = records_df.drop_duplicates(subset=["municipality_code"], keep="last")
+    municipality_ids = upsert_dimension(
+        connection, Municipality.__table__, "code",
+        [
+            {"code": code, "name": name, "state_id": state_ids[state_code]}
+            for code, name, state_code in zip(
+                municipalities["municipality_code"], municipalities["municipality_name"], municipalities["state_code"]
+            )
+        ]
+    )
+    return pd.DataFrame({
+        "crop_id": records_df["crop_name"].map(crop_ids),
+        "year": records_df["year"],
+        "municipality_id": records_df["municipality_code"].map(municipality_ids),
+        "harvested_area": records_df["harvested_area"]
+    })
+
+def is_legacy_crop_table(connection):
+    """True when crop_data still has the old wide layout (names and codes on every row)"""
+    columns = [column["name"] for column in inspect(connection).get_columns(CropData.__tablename__)]
+    return "municipality_name" in columns
+
+def read_legacy_records(connection, years):
+    """Rows of the old wide crop_data for the years that are not being reloaded"""
+    query = f"SELECT {', '.join(RECORD_COLUMNS)} FROM {CropData.__tablename__}"
+    if years:
+        # NOT IN () is a syntax error on PostgreSQL
+        query += f" WHERE year NOT IN ({', '.join(str(int(year)) for year in years)})"
+    return pd.read_sql(text(query), connection)
+
+def create_staging_table(connection):
+    """Create an empty, index-less copy of crop_data to bulk load into"""
+    # The dimension tables come along so the staging foreign keys resolve
+    metadata = MetaData()
+    for dimension in (State, Crop, Municipality):
+        dimension.__table__.to_metadata(metadata)
+    staging = CropData.__table__.to_metadata(metadata, name=STAGING_TABLE)
+    staging.indexes.clear()
+    staging.drop(connection, checkfirst=True)
+    staging.create(connection)
+    return staging
+
+def copy_batches(connection, staging, batches):
+    """Stream batches into the staging table with COPY (PostgreSQL/psycopg2)"""
+    columns = FACT_COLUMNS
+    cursor = connection.connection.cursor()
     try:
-        logger.info(f"Starting to process IBGE data from {excel_path}")
+        for batch in batches:
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerows([row[column] for column in columns] for row in batch)
+            buffer.seek(0)
+            cursor.copy_expert(
+                f"COPY {staging.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)",
+                buffer
+            )
+            yield len(batch)
+    finally:
+        cursor.close()
+
+def insert_batches(connection, staging, batches):
+    """Stream batches into the staging table with executemany (SQLite and others)"""
+    for batch in batches:
+        connection.execute(staging.insert(), batch)
+        yield len(batch)
+
+def copy_other_years(connection, staging, years):
+    """Carry the rows of every year not being reloaded over from crop_data into the staging table"""
+    table = CropData.__table__
+    columns = FACT_COLUMNS
+    result = connection.execute(staging.insert().from_select(
+        columns,
+        select(*[table.c[column] for column in columns]).where(table.c.year.notin_(years))
+    ))
+    return result.rowcount
+
+def create_staging_indexes(connection, staging):
+    """Build crop_data's indexes on the loaded staging table under temporary names"""
+    table = CropData.__table__
+    
+    # Point each index expression (including DESC columns) at the staging table
+    def staging_column(element):
+        if isinstance(element, Column) and element.table is table:
+            return staging.c[element.name]
+        return None
+    
+    for index in table.indexes:
+        Index(
+            f"{index.name}_staging",
+            *[replacement_traverse(expression, {}, staging_column) for expression in index.expressions],
+            unique=index.unique
+        ).create(connection)
+
+def swap_staging_table(connection, staging):
+    """Atomically swap the loaded staging table in as crop_data"""
+    table = CropData.__table__
+    postgres = connection.dialect.name == "postgresql"
+    
+    # One transaction: readers see either the old or the new table, never an empty one
+    with connection.begin():
+        if connection.dialect.name == "sqlite":
+            # pysqlite does not open a transaction before DDL; without this each statement commits alone
+            connection.exec_driver_sql("BEGIN IMMEDIATE")
+        connection.execute(text(f"DROP TABLE IF EXISTS {table.name}_old"))
+        connection.execute(text(f"ALTER TABLE {table.name} RENAME TO {table.name}_old"))
+        connection.execute(text(f"ALTER TABLE {staging.name} RENAME TO {table.name}"))
+        connection.execute(text(f"DROP TABLE {table.name}_old"))
         
-        # Read Excel file
-        df = pd.read_excel(excel_path)
-        logger.info(f"Excel file loaded with {len(df)} rows and {len(df.columns)} columns")
+        if postgres:
+            connection.execute(text(f"ALTER INDEX {staging.name}_pkey RENAME TO {table.name}_pkey"))
+            for index in table.indexes:
+                connection.execute(text(f"ALTER INDEX {index.name}_staging RENAME TO {index.name}"))
+        else:
+            # SQLite cannot rename indexes; recreate them under their real names
+            for index in table.indexes:
+                connection.execute(text(f"DROP INDEX {index.name}_staging"))
+                index.create(connection)
+
+def bulk_load_crop_records(records_df, batch_size=BULK_BATCH_SIZE):
+    """Replace the years present in records_df: load them plus the other years into a staging table and swap it in"""
+    engine = db.engine
+    db.metadata.create_all(engine, tables=[State.__table__, Crop.__table__, Municipality.__table__, CropData.__table__])
+    years = sorted(int(year) for year in records_df["year"].unique())
+    
+    with engine.connect() as connection:
+        with connection.begin():
+            # A crop_data table in the old wide layout is migrated by reloading its other years as records
+            legacy = is_legacy_crop_table(connection)
+            if legacy:
+                records_df = pd.concat([read_legacy_records(connection, years), records_df], ignore_index=True)
+            
+            # Replaced by ix_crop_data_crop_municipality (it indexed a column with two distinct values)
+            connection.execute(text("DROP INDEX IF EXISTS ix_municipality_code_length"))
+            facts_df = attach_dimension_keys(connection, records_df)
+            staging = create_staging_table(connection)
+            kept = 0 if legacy else copy_other_years(connection, staging, years)
+            logger.info(f"Kept {kept} records of other years; reloading {years}")
+            batches = iter_record_batches(facts_df, batch_size)
+            
+            if connection.dialect.driver == "psycopg2":
+                loader = copy_batches(connection, staging, batches)
+            else:
+                loader = insert_batches(connection, staging, batches)
+            
+            loaded = 0
+            for count in loader:
+                loaded += count
+                logger.debug(f"Loaded {loaded} records into {staging.name}")
+            
+            # Indexes are cheaper to build once after the load than to maintain per row
+            create_staging_indexes(connection, staging)
         
-        # Log column names for debugging
-        logger.debug(f"Columns in Excel: {list(df.columns)}")
+        swap_staging_table(connection, staging)
         
-        # Clear existing data
-        db.session.query(CropData).delete()
-        db.session.commit()
+        # Fresh planner statistics so joins start from the small dimension tables
+        with connection.begin():
+            for model in (State, Crop, Municipality, CropData):
+                connection.execute(text(f"ANALYZE {model.__tablename__}"))
+    
+    return loaded
+
+def process_ibge_data(excel_paths):
+    """Process one or more yearly IBGE Excel files and bulk load them into the database
+
+    The year of each workbook comes from its file name; years not in
+    excel_paths keep their rows.
+    """
+    if isinstance(excel_paths, str):
+        excel_paths = [excel_paths]
+    try:
+        records_by_path = {}
+        rejected_by_path = {}
+        for excel_path in excel_paths:
+            year = source_year(excel_path) or DEFAULT_YEAR
+            logger.info(f"Starting to process IBGE data for {year} from {excel_path}")
+            
+            # Read the first sheet with the configured engine (codes stay text)
+            df = read_first_sheet(excel_path)
+            logger.info(f"Excel file loaded with {len(df)} rows and {len(df.columns)} columns")
+            
+            # Log column names for debugging
+            logger.debug(f"Columns in Excel: {list(df.columns)}")
+            
+            # Clean the whole sheet at once
+            records_by_path[excel_path], rejected_by_path[excel_path] = build_crop_records(df, year)
+        
+        # One staging load and swap for every year; a later workbook of the same year wins
+        records_df = pd.concat(records_by_path.values(), ignore_index=True).drop_duplicates(
+            subset=["year", "crop_name", "municipality_code"], keep="last"
+        )
+        processed_count = bulk_load_crop_records(records_df)
+        # Sheet cells that had a value but no valid area (text, zero or negative)
+        error_count = sum(rejected_by_path.values())
         
-        processed_count = 0
-        error_count = 0
-        
-        # Get crop columns (skip CÓDIGO IBGE and MUNICÍPIO - UF)
-        crop_columns = df.columns[2:]
-        
-        # Process each row and each crop
-        for index, row in df.iterrows():
-            try:
-                municipality_code = str(row.iloc[0]) if pd.notna(row.iloc[0]) else "0"
-                municipality_info = str(row.iloc[1]) if pd.notna(row.iloc[1]) else "Unknown"
-                
-                # Extract municipality name and state from "MUNICÍPIO - UF" format
-                if " (" in municipality_info and municipality_info.endswith(")"):
-                    municipality_name = municipality_info.split(" (")[0]
-                    state_code = municipality_info.split(" (")[1].replace(")", "")
-                else:
-                    municipality_name = municipality_info
-                    state_code = "XX"
-                
-                # Process each crop for this municipality
-                for crop_name in crop_columns:
-                    try:
-                        area_value = row[crop_name]
-                        
-                        # Skip if no data or dash
-                        if pd.isna(area_value) or area_value == '-' or area_value == '':
-                            continue
-                            
-                        # Convert to float
-                        if isinstance(area_value, str):
-                            area_value = area_value.replace(',', '.')
-                            if not area_value.replace('.', '', 1).isdigit():
-                                continue
-                        
-                        harvested_area = float(area_value)
-                        if harvested_area <= 0:
-                            continue
-                            
-                        crop_data = CropData(
-                            municipality_code=municipality_code,
-                            municipality_name=municipality_name,
-                            state_code=state_code,
-                            crop_name=crop_name,
-                            harvested_area=harvested_area,
-                            year=2023
-                        )
-                        
-                        db.session.add(crop_data)
-                        processed_count += 1
-                        
-                        if processed_count % 500 == 0:
-                            db.session.commit()
-                            logger.debug(f"Processed {processed_count} records")
-                            
-                    except Exception as crop_error:
-                        error_count += 1
-                        continue
-                        
-            except Exception as e:
-                error_count += 1
-                logger.error(f"Error processing row {index}: {e}")
-                continue
-        
-        # Final commit
+        # Release the session's view of the old table
         db.session.commit()
         
         # Log processing result
-        log_entry = ProcessingLog(
-            filename=os.path.basename(excel_path),
-            status="success",
-            records_processed=processed_count
-        )
-        db.session.add(log_entry)
+        for excel_path, path_records in records_by_path.items():
+            log_entry = ProcessingLog(
+                filename=os.path.basename(excel_path),
+                status="success",
+                records_processed=len(path_records)
+            )
+            db.session.add(log_entry)
         db.session.commit()
         
         logger.info(f"Data processing completed. Processed: {processed_count}, Errors: {error_count}")
@@ -114,14 +311,16 @@ def process_ibge_data(excel_path):
         
     except Exception as e:
         logger.error(f"Error processing IBGE data: {e}")
+        db.session.rollback()
         
         # Log processing error
-        log_entry = ProcessingLog(
-            filename=os.path.basename(excel_path),
-            status="error",
-            error_message=str(e)
-        )
-        db.session.add(log_entry)
+        for excel_path in excel_paths:
+            log_entry = ProcessingLog(
+                filename=os.path.basename(excel_path),
+                status="error",
+                error_message=str(e)
+            )
+            db.session.add(log_entry)
         db.session.commit()
         
         return {
@@ -129,26 +328,33 @@ def process_ibge_data(excel_path):
             "error": str(e)
         }
 
+def query_crop_records():
+    """Query of (crop, municipality code, name, state, area) fact rows joined to their dimensions"""
+    return db.session.query(
+        Crop.name, Municipality.code, Municipality.name, State.code, CropData.harvested_area
+    ).select_from(CropData).join(Crop, CropData.crop_id == Crop.id).join(
+        Municipality, CropData.municipality_id == Municipality.id
+    ).join(State, Municipality.state_id == State.id)
+
 def save_processed_data_to_json():
     """Save processed data to JSON file for frontend use"""
     try:
         # Ensure data directory exists
         os.makedirs('data', exist_ok=True)
         
-        # Get all crop data
-        crop_data = db.session.query(CropData).all()
+        # Get the crop data of the latest year
+        crop_data = query_crop_records().filter(CropData.year == latest_year()).all()
         
         # Group by crop
         data_by_crop = {}
-        for record in crop_data:
-            crop_name = record.crop_name
+        for crop_name, municipality_code, municipality_name, state_code, harvested_area in crop_data:
             if crop_name not in data_by_crop:
                 data_by_crop[crop_name] = {}
             
-            data_by_crop[crop_name][record.municipality_code] = {
-                "municipality_name": record.municipality_name,
-                "state_code": record.state_code,
-                "harvested_area": record.harvested_area
+            data_by_crop[crop_name][municipality_code] = {
+                "municipality_name": municipality_name,
+                "state_code": state_code,
+                "harvested_area": harvested_area
             }
         
         # Save to JSON
@@ -163,27 +369,34 @@ def save_processed_data_to_json():
 def get_available_crops():
     """Get list of available crops"""
     try:
-        crops = db.session.query(CropData.crop_name).distinct().all()
+        crops = db.session.query(Crop.name).filter(
+            db.session.query(CropData).filter(CropData.crop_id == Crop.id).exists()
+        ).all()
         return [crop[0] for crop in crops if crop[0]]
     except Exception as e:
         logger.error(f"Error getting available crops: {e}")
         return []
 
-def get_crop_data_for_map(crop_name):
-    """Get crop data formatted for map visualization"""
+def latest_year():
+    """Most recent year loaded into crop_data"""
+    return db.session.query(db.func.max(CropData.year)).scalar() or DEFAULT_YEAR
+
+def get_crop_data_for_map(crop_name, year=None):
+    """Get crop data of one year (the latest by default) formatted for map visualization"""
     try:
         # Only get records with valid 7-digit municipality codes
-        crop_data = db.session.query(CropData).filter(
-            CropData.crop_name == crop_name,
-            db.func.length(CropData.municipality_code) == 7
+        crop_data = query_crop_records().filter(
+            Crop.name == crop_name,
+            CropData.year == (year or latest_year()),
+            Municipality.code_length == 7
         ).all()
         
         data = {}
-        for record in crop_data:
-            data[record.municipality_code] = {
-                "municipality_name": record.municipality_name,
-                "state_code": record.state_code,
-                "harvested_area": record.harvested_area
+        for _, municipality_code, municipality_name, state_code, harvested_area in crop_data:
+            data[municipality_code] = {
+                "municipality_name": municipality_name,
+                "state_code": state_code,
+                "harvested_area": harvested_area
             }
         
         logger.info(f"Returning {len(data)} valid municipality records for {crop_name}")
@@ -191,3 +404,36 @@ def get_crop_data_for_map(crop_name):
     except Exception as e:
         logger.error(f"Error getting crop data for map: {e}")
         return {}
+
+def get_data_years():
+    """Years loaded into crop_data, oldest first"""
+    return [year for (year,) in db.session.query(CropData.year).distinct().order_by(CropData.year)]
+
+def load_year_crop_data(year):
+    """{crop: {municipality_code: data}} of one year, read crop by crop through the (crop_id, year, area) index"""
+    crops = db.session.query(Crop.id, Crop.name).filter(
+        db.session.query(CropData).filter(CropData.crop_id == Crop.id, CropData.year == year).exists()
+    ).order_by(Crop.name).all()
+    data = {}
+    for crop_id, crop_name in crops:
+        rows = db.session.query(
+            Municipality.code, Municipality.name, State.code, CropData.harvested_area
+        ).select_from(CropData).join(Municipality, CropData.municipality_id == Municipality.id).join(
+            State, Municipality.state_id == State.id
+        ).filter(
+            CropData.crop_id == crop_id,
+            CropData.year == year
+        ).order_by(CropData.harvested_area.desc())
+        data[crop_name] = {
+            municipality_code: {
+                "municipality_name": municipality_name,
+                "state_code": state_code,
+                "harvested_area": harvested_area
+            }
+            for municipality_code, municipality_name, state_code, harvested_area in rows
+        }
+    return data
+
+def get_data_version():
+    """Id of the latest processing log entry; changes whenever a load finishes"""
+    return db.session.query(db.func.max(ProcessingLog.id)).scalar()
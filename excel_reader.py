@@ -0,0 +1,146 @@
+import os
+import sys
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+import openpyxl
+
+try:
+    import python_calamine
+except ImportError:
+    python_calamine = None
+
+# The first column of the IBGE sheets is the 7-digit municipality code
+CODE_COLUMN = 0
+
+# Engine used when none is given; auto picks calamine when installed, else openpyxl
+ENGINE_VARIABLE = 'IBGE_EXCEL_ENGINE'
+
+def code_text(value):
+    """Municipality code cell as text, without a detour through float"""
+    if value is None:
+        return None
+    if isinstance(value, float):
+        return str(int(value)) if value.is_integer() else str(value)
+    return str(value).strip()
+
+def unique_columns(header):
+    """Column labels the way pandas names them: Unnamed: i for blanks, .1 suffixes for repeats"""
+    columns = []
+    seen = {}
+    for i, label in enumerate(header):
+        label = f"Unnamed: {i}" if label is None or label == '' else label
+        count = seen.get(label, 0)
+        seen[label] = count + 1
+        columns.append(label if count == 0 else f"{label}.{count}")
+    return columns
+
+def rows_to_frame(rows):
+    """DataFrame from a header row plus data rows; blank rows are skipped and codes kept as text"""
+    rows = iter(rows)
+    header = next(rows, None)
+    if header is None:
+        return pd.DataFrame()
+    width = len(header)
+    data = []
+    for row in rows:
+        row = tuple(row[:width]) + (None,) * (width - len(row))
+        if any(value is not None and value != '' for value in row):
+            data.append((code_text(row[CODE_COLUMN]),) + row[CODE_COLUMN + 1:])
+    return pd.DataFrame.from_records(data, columns=unique_columns(header))
+
+def read_openpyxl(path, first_sheet_only=False):
+    """Stream rows with openpyxl in read-only mode, one sheet at a time"""
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        sheets = {}
+        for worksheet in workbook.worksheets[:1] if first_sheet_only else workbook.worksheets:
+            sheets[worksheet.title] = rows_to_frame(worksheet.iter_rows(values_only=True))
+        return sheets
+    finally:
+        workbook.close()
+
+def read_calamine(path, first_sheet_only=False):
+    """Read sheets with the Rust calamine parser (optional python-calamine package)"""
+    if python_calamine is None:
+        raise RuntimeError("python-calamine não está instalado")
+    workbook = python_calamine.CalamineWorkbook.from_path(path)
+    sheet_names = workbook.sheet_names[:1] if first_sheet_only else workbook.sheet_names
+    sheets = {}
+    for sheet_name in sheet_names:
+        rows = workbook.get_sheet_by_name(sheet_name).to_python(skip_empty_area=False)
+        # calamine returns '' for empty cells where openpyxl returns None
+        sheets[sheet_name] = rows_to_frame(
+            tuple(None if value == '' else value for value in row) for row in rows
+        )
+    return sheets
+
+def read_pandas(path, first_sheet_only=False):
+    """pd.read_excel with default settings, except the code column is read as text"""
+    with pd.ExcelFile(path) as book:
+        sheets = pd.read_excel(book, sheet_name=0 if first_sheet_only else None, converters={CODE_COLUMN: code_text})
+        if first_sheet_only:
+            return {book.sheet_names[0]: sheets}
+    return sheets
+
+READERS = {
+    'openpyxl': read_openpyxl,
+    'calamine': read_calamine,
+    'pandas': read_pandas
+}
+
+def default_engine():
+    engine = os.environ.get(ENGINE_VARIABLE, 'auto')
+    if engine == 'auto':
+        return 'calamine' if python_calamine is not None else 'openpyxl'
+    return engine
+
+def read_workbook(path, engine=None, first_sheet_only=False):
+    """{sheet_name: DataFrame} of an Excel workbook, read with the given (or default) engine"""
+    engine = engine or default_engine()
+    if engine not in READERS:
+        raise ValueError(f"Engine de Excel desconhecida: {engine} (use {', '.join(READERS)})")
+    return READERS[engine](path, first_sheet_only)
+
+def read_first_sheet(path, engine=None):
+    """DataFrame of the first sheet of an Excel workbook"""
+    return next(iter(read_workbook(path, engine, first_sheet_only=True).values()))
+
+def _peak_rss_mib():
+    # Unix only (ru_maxrss is KiB on Linux, bytes on macOS); imported here so reading workbooks works everywhere
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+def _measure_engine(path, engine):
+    """Parse time and peak RSS growth of one engine (runs in a fresh process)"""
+    baseline = _peak_rss_mib()
+    started = time.perf_counter()
+    sheets = read_workbook(path, engine)
+    seconds = time.perf_counter() - started
+    rows = sum(len(df) for df in sheets.values())
+    return seconds, _peak_rss_mib() - baseline, rows
+
+def benchmark_engines(path, engines=None, repeat=3):
+    """Time each available engine on one workbook; every run gets a fresh process for clean peak memory"""
+    engines = engines or [engine for engine in READERS if engine != 'calamine' or python_calamine is not None]
+    context = multiprocessing.get_context('spawn')
+    results = {}
+    for engine in engines:
+        runs = []
+        for _ in range(repeat):
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                runs.append(executor.submit(_measure_engine, path, engine).result())
+        results[engine] = {
+            'seconds': min(run[0] for run in runs),
+            'peak_mib': min(run[1] for run in runs),
+            'rows': runs[0][2]
+        }
+    return results
+
+if __name__ == "__main__":
+    workbook_path = sys.argv[1] if len(sys.argv) > 1 else 'data/ibge_2023_hectares_colhidos.xlsx'
+    print(f"{workbook_path} ({os.path.getsize(workbook_path) / 1024 / 1024:.1f} MB)")
+    print(f"{'Engine':<10} {'Parse s':>8} {'Peak MiB':>9} {'Rows':>7}")
+    for engine, result in benchmark_engines(workbook_path).items():
+        print(f"{engine:<10} {result['seconds']:>8.2f} {result['peak_mib']:>9.1f} {result['rows']:>7}")
@@ -1,18 +1,55 @@
 from app import db
 from datetime import datetime
 
-class CropData(db.Model):
+class State(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    code = db.Column(db.String(2), nullable=False, unique=True)
+
+    def __repr__(self):
+        return f'<State {self.code}>'
+
+class Crop(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False, unique=True)
+
+    def __repr__(self):
+        return f'<Crop {self.name}>'
+
+class Municipality(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    municipality_code = db.Column(db.String(10), nullable=False)
-    municipality_name = db.Column(db.String(100), nullable=False)
-    state_code = db.Column(db.String(2), nullable=False)
-    crop_name = db.Column(db.String(100), nullable=False)
+    code = db.Column(db.String(10), nullable=False, unique=True)
+    # Stored so "7-digit municipality codes only" filters compare a column instead of computing length() per row
+    code_length = db.Column(db.SmallInteger, db.Computed('length(code)', persisted=True))
+    name = db.Column(db.String(100), nullable=False)
+    state_id = db.Column(db.Integer, db.ForeignKey('state.id'), nullable=False, index=True)
+
+    state = db.relationship('State')
+
+    def __repr__(self):
+        return f'<Municipality {self.code} {self.name}>'
+
+class CropData(db.Model):
+    """Harvested area fact: one narrow row of integer keys per crop, year and municipality"""
+    crop_id = db.Column(db.SmallInteger, db.ForeignKey('crop.id'), primary_key=True)
+    year = db.Column(db.SmallInteger, primary_key=True, default=2023)
+    municipality_id = db.Column(db.Integer, db.ForeignKey('municipality.id'), primary_key=True)
     harvested_area = db.Column(db.Float, nullable=False)
-    year = db.Column(db.Integer, nullable=False, default=2023)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    crop = db.relationship('Crop')
+    municipality = db.relationship('Municipality')
 
     def __repr__(self):
-        return f'<CropData {self.municipality_name} - {self.crop_name}>'
+        return f'<CropData {self.municipality_id} - {self.crop_id} ({self.year})>'
+
+# Declared as indexes (not constraints) so the bulk load can rebuild them on its staging table;
+# the primary key already covers (crop, year, municipality) lookups and uniqueness
+db.Index('ix_crop_data_crop_year_area', CropData.crop_id, CropData.year, CropData.harvested_area.desc())
+# Year first and covering the area so per-year group-bys by state read it without touching the table
+db.Index('ix_crop_data_year_municipality_area', CropData.year, CropData.municipality_id, CropData.harvested_area)
+# State + crop lookups: the municipalities of a state (ix_municipality_state_id) probe this per crop
+db.Index(
+    'ix_crop_data_crop_municipality', CropData.crop_id, CropData.municipality_id, CropData.year, CropData.harvested_area
+)
 
 class ProcessingLog(db.Model):
     id = db.Column(db.Integer, primary_key=True)
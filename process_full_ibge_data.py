@@ -1,131 +1,333 @@
 
 import pandas as pd
+import glob
+import hashlib
 import json
 import os
+import re
+import sys
+import time
 import logging
+from crop_store import CropStore
+from excel_reader import read_workbook
+from profiling import save_report, stage, stage_history_file, start_profiler, timed_run
+from crop_years import (
+    DEFAULT_YEAR, YEARS_INDEX_FILE, read_year_dataset, remove_year_dataset, write_year_dataset,
+    write_years_index, year_files
+)
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def process_complete_ibge_data():
-    """Process the complete IBGE Excel file with all municipalities and crops"""
-    
-    excel_files = [
-        'attached_assets/IBGE - 2023 - BRASIL HECTARES COLHIDOS_1752979906944.xlsx',
-        'attached_assets/IBGE - 2023 - BRASIL HECTARES COLHIDOS_1752980032040.xlsx',
-        'data/ibge_2023_hectares_colhidos.xlsx'
-    ]
+# Cell values IBGE uses for "no data" in the harvested area sheet
+AREA_PLACEHOLDERS = ['-', '', '...']
+
+# IBGE harvested area workbooks; byte-identical copies are processed once
+SOURCE_PATTERNS = [
+    'attached_assets/IBGE - * - BRASIL HECTARES COLHIDOS*.xlsx',
+    'data/ibge_*_hectares_colhidos.xlsx'
+]
+
+CROP_DATA_FILE = 'data/crop_data_static.json'
+CROP_SNAPSHOT_FILE = 'data/crop_data_static.bin'
+ARTIFACT_FILES = [CROP_DATA_FILE, CROP_SNAPSHOT_FILE, YEARS_INDEX_FILE]
+
+# Content hashes of the source workbooks and generated files of the last build
+MANIFEST_FILE = 'data/ibge_build_manifest.json'
+MANIFEST_VERSION = 2
+
+def split_municipality_info(municipality_info):
+    """Split "MUNICÍPIO (UF)" strings into name and state columns"""
+    has_state = municipality_info.str.contains(" (", regex=False) & municipality_info.str.endswith(")")
+    parts = municipality_info.str.split(" (", regex=False)
     
-    excel_path = None
-    for file_path in excel_files:
-        if os.path.exists(file_path):
-            excel_path = file_path
-            break
+    municipality_name = parts.str[0].str.strip().where(has_state, municipality_info.str.strip())
+    state_code = parts.str[1].str.replace(")", "", regex=False).str.strip().where(has_state, "XX")
+    return municipality_name, state_code
+
+def municipality_codes(codes):
+    """IBGE codes as 7-digit strings, as keyed everywhere (regional total rows get leading zeros)"""
+    return codes.astype(str).str.zfill(7)
+
+def clean_area_values(values):
+    """Convert raw sheet cells to harvested areas, NaN where the cell has no valid data"""
+    # Placeholders ('-', '', '...') are the bulk of the sheet; drop them before parsing
+    values = values.mask(values.isin(AREA_PLACEHOLDERS))
+    areas = pd.to_numeric(values, errors='coerce').astype(float)
     
-    if not excel_path:
-        logger.error("Nenhum arquivo Excel do IBGE encontrado!")
-        return
+    # Remaining text cells may use comma decimals or embedded spaces
+    if values.dtype == object:
+        retry = areas.isna() & values.notna()
+        text = values[retry].str.replace(',', '.', regex=False).str.replace(' ', '', regex=False)
+        areas[retry] = pd.to_numeric(text, errors='coerce').astype(float)
     
-    try:
-        logger.info(f"Processando arquivo: {excel_path}")
-        
-        # Read Excel file
-        df = pd.read_excel(excel_path)
-        logger.info(f"Arquivo carregado com {len(df)} linhas e {len(df.columns)} colunas")
+    # Keep only positive areas
+    return areas.where(areas > 0)
+
+def build_crop_data(df):
+    """Melt the wide IBGE sheet and group it into {crop: {municipality_code: data}}"""
+    with stage("clean"):
+        codes = df.iloc[:, 0]
+        infos = df.iloc[:, 1]
+        crop_columns = list(df.columns[2:])
         
-        # Show column names
-        logger.info(f"Colunas: {list(df.columns)}")
+        # Drop rows without code or municipality description
+        valid = codes.notna() & infos.notna()
+        valid &= (codes.astype(str) != "") & (infos.astype(str) != "")
+        wide_df = df.loc[valid, crop_columns]
+        municipality_info = infos[valid].astype(str)
+        wide_df.insert(0, "municipality_code", municipality_codes(codes[valid]))
+        municipality_name, state_code = split_municipality_info(municipality_info)
+        wide_df.insert(1, "municipality_name", municipality_name)
+        wide_df.insert(2, "state_code", state_code)
         
-        # Dictionary to store all data
+        # Wide (municipality x crop) to long (crop, municipality) form, crop-major
+        long_df = wide_df.melt(
+            id_vars=["municipality_code", "municipality_name", "state_code"],
+            value_vars=crop_columns,
+            var_name="crop_name",
+            value_name="harvested_area"
+        )
+        long_df["harvested_area"] = clean_area_values(long_df["harvested_area"])
+        long_df = long_df.dropna(subset=["harvested_area"])
+    
+    with stage("group"):
         complete_crop_data = {}
+        for crop_name, group in long_df.groupby("crop_name", sort=False):
+            complete_crop_data[crop_name] = {
+                municipality_code: {
+                    "municipality_name": municipality_name,
+                    "state_code": state_code,
+                    "harvested_area": harvested_area
+                }
+                for municipality_code, municipality_name, state_code, harvested_area in zip(
+                    group["municipality_code"].tolist(),
+                    group["municipality_name"].tolist(),
+                    group["state_code"].tolist(),
+                    group["harvested_area"].tolist()
+                )
+            }
+    
+    return complete_crop_data, len(wide_df), len(long_df)
+
+def file_digest(path, cached=None):
+    """{size, mtime_ns, sha256} of a file; the hash is reused while size and mtime are unchanged"""
+    stat = os.stat(path)
+    if cached and cached.get('size') == stat.st_size and cached.get('mtime_ns') == stat.st_mtime_ns:
+        return cached
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': digest.hexdigest()}
+
+def source_year(path):
+    """Harvest year in an IBGE workbook file name, None when it has none"""
+    match = re.search(r'(?<!\d)(19|20)\d{2}(?!\d)', os.path.basename(path))
+    return int(match.group(0)) if match else None
+
+def source_order(source):
+    """Workbooks are merged oldest year first, then by path"""
+    return source['year'], source['paths'][0]
+
+def load_manifest():
+    try:
+        with open(MANIFEST_FILE, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('version') == MANIFEST_VERSION:
+            return manifest
+    except (OSError, ValueError):
+        pass
+    return {'version': MANIFEST_VERSION, 'files': {}, 'sources': {}, 'artifacts': {}}
+
+def save_manifest(manifest):
+    temp_path = f"{MANIFEST_FILE}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(temp_path, MANIFEST_FILE)
+
+def find_sources(file_cache):
+    """Group the IBGE workbooks on disk by content hash, so identical copies are read once"""
+    files = {}
+    sources = {}
+    for pattern in SOURCE_PATTERNS:
+        for path in sorted(glob.glob(pattern)):
+            files[path] = file_digest(path, file_cache.get(path))
+            source = sources.setdefault(
+                files[path]['sha256'], {'paths': [], 'year': source_year(path) or DEFAULT_YEAR}
+            )
+            source['paths'].append(path)
+    return files, sources
+
+def artifacts_current(artifacts):
+    """True when every generated file still has the content recorded in the manifest"""
+    if not set(ARTIFACT_FILES) <= set(artifacts):
+        return False
+    try:
+        return all(file_digest(path, digest)['sha256'] == digest['sha256'] for path, digest in artifacts.items())
+    except OSError:
+        return False
+
+def is_data_sheet(df):
+    """Harvested area sheets have the IBGE code, the municipality and at least one crop column"""
+    return len(df.columns) >= 3 and pd.to_numeric(df.iloc[:, 0], errors='coerce').notna().any()
+
+def read_source_sheets(path):
+    """Crop data of every data sheet of one workbook: {sheet_name: (crop_data, municipalities, records)}"""
+    sheets = {}
+    with stage("read_excel"):
+        workbook = read_workbook(path)
+    for sheet_name, df in workbook.items():
+        if not is_data_sheet(df):
+            logger.info(f"Ignorando planilha sem dados de área colhida: {sheet_name}")
+            continue
+        logger.info(f"Planilha {sheet_name}: {len(df)} linhas e {len(df.columns)} colunas")
+        sheets[sheet_name] = build_crop_data(df)
+    return sheets
+
+def merge_year_sources(year_sources, previous_sources, crop_data):
+    """Merge the workbooks of one year into its existing crop data, re-reading only what changed
+
+    Returns the merged crop data, the sources that were read and the most
+    municipalities processed in one sheet.
+    """
+    # Drop the crops of workbooks that changed or disappeared
+    crop_sources = {}
+    for source_hash, source in previous_sources.items():
+        for crop_names in source['sheets'].values():
+            for crop_name in crop_names:
+                crop_sources[crop_name] = source_hash
+    orphaned_crops = set()
+    for crop_name, source_hash in list(crop_sources.items()):
+        if source_hash not in year_sources:
+            crop_data.pop(crop_name, None)
+            del crop_sources[crop_name]
+            orphaned_crops.add(crop_name)
+    
+    # Ingest new workbooks, plus kept ones that also have a crop whose owner went away
+    ingest_sources = {}
+    for source_hash, source in year_sources.items():
+        previous = previous_sources.get(source_hash)
+        if previous is None or any(orphaned_crops.intersection(crops) for crops in previous['sheets'].values()):
+            ingest_sources[source_hash] = source
+        else:
+            source['sheets'] = previous['sheets']
+    
+    # A crop in several workbooks of the same year comes from the last one read
+    processed_municipalities = 0
+    for source_hash, source in sorted(ingest_sources.items(), key=lambda item: source_order(item[1])):
+        excel_path = source['paths'][0]
+        logger.info(f"Processando arquivo: {excel_path} ({source['year']})")
+        if len(source['paths']) > 1:
+            logger.info(f"Cópias idênticas ignoradas: {source['paths'][1:]}")
         
-        # Get crop columns (skip first two columns which are code and municipality)
-        crop_columns = df.columns[2:]
-        logger.info(f"Culturas encontradas: {len(crop_columns)} culturas")
+        source['sheets'] = {}
+        for sheet_name, (sheet_crop_data, municipalities, _) in read_source_sheets(excel_path).items():
+            processed_municipalities = max(processed_municipalities, municipalities)
+            source['sheets'][sheet_name] = list(sheet_crop_data)
+            for crop_name, municipalities_data in sheet_crop_data.items():
+                crop_data[crop_name] = municipalities_data
+                crop_sources[crop_name] = source_hash
+            logger.info(f"Culturas encontradas em {sheet_name}: {len(sheet_crop_data)} culturas")
+    
+    # Same crop order as a full rebuild: by workbook, sheet and column
+    ordered_crop_data = {}
+    for source_hash, source in sorted(year_sources.items(), key=lambda item: source_order(item[1])):
+        for crop_names in source['sheets'].values():
+            for crop_name in crop_names:
+                if crop_sources.get(crop_name) == source_hash and crop_name not in ordered_crop_data:
+                    ordered_crop_data[crop_name] = crop_data[crop_name]
+    return ordered_crop_data, ingest_sources, processed_municipalities
+
+def process_complete_ibge_data(force=False):
+    """Process the IBGE Excel files of every year, re-ingesting only changed workbooks"""
+    started = time.perf_counter()
+    with stage("hash_sources"):
+        manifest = load_manifest()
+        files, sources = find_sources(manifest['files'])
+    
+    if not sources:
+        logger.error("Nenhum arquivo Excel do IBGE encontrado!")
+        return {"success": False, "error": "Nenhum arquivo Excel do IBGE encontrado"}
+    
+    try:
+        have_artifacts = not force and artifacts_current(manifest['artifacts'])
+        if have_artifacts and set(sources) == set(manifest['sources']):
+            logger.info(f"Nenhuma planilha alterada; dados mantidos ({(time.perf_counter() - started) * 1000:.0f} ms)")
+            manifest['files'] = files
+            save_manifest(manifest)
+            return dict(manifest['summary'], skipped=True)
         
-        # Initialize crop dictionaries
-        for crop_name in crop_columns:
-            complete_crop_data[crop_name] = {}
+        previous_sources = manifest['sources'] if have_artifacts else {}
+        sources_by_year = {}
+        for source_hash, source in sources.items():
+            sources_by_year.setdefault(source['year'], {})[source_hash] = source
+        previous_by_year = {}
+        for source_hash, source in previous_sources.items():
+            previous_by_year.setdefault(source['year'], {})[source_hash] = source
         
+        # Only years with a new, changed or removed workbook are rebuilt
+        years = sorted(sources_by_year)
+        year_data = {}
+        ingested = 0
         processed_municipalities = 0
-        total_records = 0
-        
-        # Process each row (municipality)
-        for index, row in df.iterrows():
-            try:
-                # Get municipality code and info
-                municipality_code = str(row.iloc[0]) if pd.notna(row.iloc[0]) else None
-                municipality_info = str(row.iloc[1]) if pd.notna(row.iloc[1]) else None
-                
-                if not municipality_code or not municipality_info:
-                    continue
-                
-                # Ensure municipality code has correct format (7 digits)
-                municipality_code = municipality_code.zfill(7)
-                
-                # Extract municipality name and state
-                if " (" in municipality_info and municipality_info.endswith(")"):
-                    municipality_name = municipality_info.split(" (")[0].strip()
-                    state_code = municipality_info.split(" (")[1].replace(")", "").strip()
-                else:
-                    municipality_name = municipality_info.strip()
-                    state_code = "XX"
-                
-                processed_municipalities += 1
-                
-                # Process each crop for this municipality
-                for crop_name in crop_columns:
-                    try:
-                        area_value = row[crop_name]
-                        
-                        # Skip if no data, dash, or empty
-                        if pd.isna(area_value) or area_value == '-' or area_value == '':
-                            continue
-                        
-                        # Convert to numeric
-                        if isinstance(area_value, str):
-                            # Remove any non-numeric characters except decimal point
-                            area_value = area_value.replace(',', '.').replace(' ', '')
-                            try:
-                                area_value = float(area_value)
-                            except:
-                                continue
-                        
-                        # Convert to float and validate
-                        harvested_area = float(area_value)
-                        if harvested_area <= 0:
-                            continue
-                        
-                        # Add to data structure
-                        complete_crop_data[crop_name][municipality_code] = {
-                            "municipality_name": municipality_name,
-                            "state_code": state_code,
-                            "harvested_area": harvested_area
-                        }
-                        
-                        total_records += 1
-                        
-                    except Exception as crop_error:
-                        continue
-                
-                # Log progress every 1000 municipalities
-                if processed_municipalities % 1000 == 0:
-                    logger.info(f"Processados {processed_municipalities} municípios...")
-                    
-            except Exception as e:
-                logger.error(f"Erro na linha {index}: {e}")
+        for year in sorted(set(years) | set(previous_by_year)):
+            year_sources = sources_by_year.get(year, {})
+            previous_year_sources = previous_by_year.get(year, {})
+            if not year_sources:
+                logger.info(f"Removendo dados de {year}: nenhuma planilha encontrada")
+                remove_year_dataset(year)
                 continue
+            if set(year_sources) == set(previous_year_sources):
+                for source_hash, source in year_sources.items():
+                    source['sheets'] = previous_year_sources[source_hash]['sheets']
+                with stage("read_json"):
+                    year_data[year] = read_year_dataset(year)
+                continue
+            
+            with stage("read_json"):
+                crop_data = read_year_dataset(year) if previous_year_sources else {}
+            year_data[year], ingest_sources, municipalities = merge_year_sources(
+                year_sources, previous_year_sources, crop_data
+            )
+            ingested += len(ingest_sources)
+            processed_municipalities = max(processed_municipalities, municipalities)
+            write_year_dataset(year, year_data[year])
+            logger.info(f"Ano {year}: {len(year_data[year])} culturas")
         
-        # Remove crops with no data
-        complete_crop_data = {crop: data for crop, data in complete_crop_data.items() if data}
+        # The default dataset has each crop from the latest year that has it
+        with stage("group"):
+            latest_year = {}
+            for year in years:
+                for crop_name in year_data[year]:
+                    latest_year[crop_name] = year
+            complete_crop_data = {
+                crop_name: municipalities_data
+                for year in years for crop_name, municipalities_data in year_data[year].items()
+                if latest_year[crop_name] == year
+            }
         
         # Save to JSON file
-        os.makedirs('data', exist_ok=True)
-        with open('data/crop_data_static.json', 'w', encoding='utf-8') as f:
-            json.dump(complete_crop_data, f, ensure_ascii=False, indent=2)
+        with stage("serialize"):
+            text = json.dumps(complete_crop_data, ensure_ascii=False, indent=2)
+            store = CropStore.from_crop_data(complete_crop_data)
+        with stage("write"):
+            os.makedirs('data', exist_ok=True)
+            # Replaced in one step: the web workers reload as soon as the file changes
+            temp_path = f"{CROP_DATA_FILE}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                f.write(text)
+            os.replace(temp_path, CROP_DATA_FILE)
+            
+            # Binary snapshot for fast, shared (mmap) loading in the web workers
+            store.write_snapshot(CROP_SNAPSHOT_FILE, CROP_DATA_FILE)
+            write_years_index(years)
+        
+        total_records = sum(len(data) for data in complete_crop_data.values())
         
         logger.info("=" * 60)
         logger.info("PROCESSAMENTO COMPLETO!")
+        logger.info(f"Planilhas reprocessadas: {ingested} de {len(sources)}")
+        logger.info(f"Anos disponíveis: {', '.join(str(year) for year in years)}")
         logger.info(f"Total de municípios processados: {processed_municipalities}")
         logger.info(f"Total de registros válidos: {total_records}")
         logger.info(f"Total de culturas com dados: {len(complete_crop_data)}")
@@ -149,25 +351,59 @@ def process_complete_ibge_data():
         logger.info(f"\nTotal de municípios únicos com dados: {len(all_municipalities)}")
         logger.info("=" * 60)
         
-        return {
+        summary = {
             "success": True,
-            "municipalities": processed_municipalities,
+            "municipalities": processed_municipalities or manifest.get('summary', {}).get('municipalities', 0),
             "records": total_records,
             "crops": len(complete_crop_data),
-            "unique_municipalities": len(all_municipalities)
+            "unique_municipalities": len(all_municipalities),
+            "years": years
         }
+        with stage("hash_artifacts"):
+            artifacts = {
+                path: file_digest(path)
+                for path in ARTIFACT_FILES + [path for year in years for path in year_files(year)]
+            }
+        save_manifest({
+            'version': MANIFEST_VERSION,
+            'files': files,
+            'sources': sources,
+            'artifacts': artifacts,
+            'years': years,
+            'summary': summary
+        })
+        return dict(summary, skipped=False)
         
     except Exception as e:
         logger.error(f"Erro no processamento: {e}")
         return {"success": False, "error": str(e)}
 
 if __name__ == "__main__":
-    result = process_complete_ibge_data()
+    logging.basicConfig(level=logging.INFO)
+    args = sys.argv[1:]
+    # --profile writes a cProfile report of the whole run under data/profiles/ingest
+    stop_profiler = start_profiler() if '--profile' in args else None
+    with timed_run("ibge") as timer:
+        result = process_complete_ibge_data(force='--force' in args)
+    if stop_profiler:
+        print(f"\n🔍 Perfil salvo em {save_report(stop_profiler(), 'ibge', kind='ingest')}")
+    
+    # Stage timings of every run are appended to data/profiles/ibge_stages.jsonl for comparison
+    print(f"\n⏱️ Tempo por etapa:\n{timer.summary_table()}")
+    timer.append_to(
+        stage_history_file("ibge"),
+        success=result["success"], skipped=result.get("skipped", False), years=result.get("years", [])
+    )
+    
     if result["success"]:
-        print("\n✅ Processamento concluído com sucesso!")
+        if result.get("skipped"):
+            print("\n✅ Nenhuma planilha alterada; dados existentes mantidos")
+        else:
+            print("\n✅ Processamento concluído com sucesso!")
         print(f"📊 {result['municipalities']} municípios processados")
         print(f"📈 {result['records']} registros válidos")
         print(f"🌾 {result['crops']} culturas diferentes")
         print(f"🏘️ {result['unique_municipalities']} municípios únicos")
+        print(f"📅 Anos: {', '.join(str(year) for year in result['years'])}")
     else:
         print(f"\n❌ Erro: {result['error']}")
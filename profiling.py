@@ -0,0 +1,143 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+
+try:
+    from pyinstrument import Profiler as PyinstrumentProfiler
+except ImportError:
+    PyinstrumentProfiler = None
+
+PROFILE_DIR = 'data/profiles'
+# Rows of the cProfile report (sorted by cumulative time)
+REPORT_LINES = 40
+
+# Stage timer of the running ingestion, if any; stage() is a no-op without one
+_active_timer = ContextVar('active_stage_timer', default=None)
+
+# cProfile can only have one active profiler per process on recent Pythons; profile one thing at a time
+_profiler_lock = threading.Lock()
+
+class StageTimer:
+    """Wall-clock time and call count per named stage of a run"""
+
+    def __init__(self, name):
+        self.name = name
+        self.started_at = datetime.now(timezone.utc)
+        self._started = time.perf_counter()
+        self.total_seconds = None
+        self.stages = {}
+
+    def add(self, stage_name, seconds):
+        entry = self.stages.setdefault(stage_name, {'seconds': 0.0, 'calls': 0})
+        entry['seconds'] += seconds
+        entry['calls'] += 1
+
+    def stop(self):
+        self.total_seconds = time.perf_counter() - self._started
+
+    def summary_table(self):
+        """Plain-text table of the stages, slowest first, with their share of the run"""
+        total = self.total_seconds or time.perf_counter() - self._started
+        rows = sorted(self.stages.items(), key=lambda item: item[1]['seconds'], reverse=True)
+        accounted = sum(entry['seconds'] for entry in self.stages.values())
+        rows.append(('(outros)', {'seconds': max(total - accounted, 0.0), 'calls': ''}))
+        width = max([len(stage_name) for stage_name, _ in rows] + [len('etapa')])
+        lines = [f"{'etapa':<{width}}  {'chamadas':>8}  {'segundos':>9}  {'%':>5}"]
+        for stage_name, entry in rows:
+            share = entry['seconds'] / total * 100 if total else 0
+            lines.append(f"{stage_name:<{width}}  {entry['calls']:>8}  {entry['seconds']:>9.3f}  {share:>5.1f}")
+        lines.append(f"{'total':<{width}}  {'':>8}  {total:>9.3f}  {100:>5.1f}")
+        return '\n'.join(lines)
+
+    def to_dict(self, **extra):
+        return {
+            'name': self.name,
+            'started_at': self.started_at.isoformat(),
+            'total_seconds': self.total_seconds,
+            'stages': self.stages,
+            **extra
+        }
+
+    def append_to(self, path, **extra):
+        """Append this run as one JSON line, so runs can be compared over time"""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(self.to_dict(**extra), ensure_ascii=False) + '\n')
+
+@contextmanager
+def timed_run(name):
+    """Collect the stage() timings of everything run inside the block into a StageTimer"""
+    timer = StageTimer(name)
+    token = _active_timer.set(timer)
+    try:
+        yield timer
+    finally:
+        timer.stop()
+        _active_timer.reset(token)
+
+@contextmanager
+def stage(stage_name):
+    """Time a block as one stage of the active run (stages should not be nested)"""
+    timer = _active_timer.get()
+    if timer is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer.add(stage_name, time.perf_counter() - started)
+
+def stage_history_file(name):
+    return f'{PROFILE_DIR}/{name}_stages.jsonl'
+
+def start_profiler(engine='cprofile'):
+    """Profile the current thread; returns stop(), which returns the text report, or None when busy"""
+    if not _profiler_lock.acquire(blocking=False):
+        return None
+    try:
+        if engine == 'pyinstrument' and PyinstrumentProfiler is not None:
+            profiler = PyinstrumentProfiler()
+            profiler.start()
+
+            def stop():
+                try:
+                    profiler.stop()
+                    return profiler.output_text(unicode=True)
+                finally:
+                    _profiler_lock.release()
+            return stop
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+    except Exception:
+        _profiler_lock.release()
+        raise
+
+    def stop():
+        try:
+            profiler.disable()
+            stream = io.StringIO()
+            pstats.Stats(profiler, stream=stream).sort_stats('cumulative').print_stats(REPORT_LINES)
+            return stream.getvalue()
+        finally:
+            _profiler_lock.release()
+    return stop
+
+def save_report(report, name, kind='requests'):
+    """Store a profile report under PROFILE_DIR/<kind> and return its path"""
+    directory = f'{PROFILE_DIR}/{kind}'
+    os.makedirs(directory, exist_ok=True)
+    timestamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%fZ')
+    slug = ''.join(char if char.isalnum() else '_' for char in name).strip('_') or 'root'
+    path = f'{directory}/{timestamp}-{slug}.txt'
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(report)
+    return path
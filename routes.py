@@ -1,21 +1,451 @@
 import os
-from flask import Flask, render_template, jsonify, request
-from app import app
+import gzip
+import hashlib
+import hmac
+import logging
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from flask import Flask, render_template, jsonify, request, g
+from app import app, db
+from dataset_holder import DatasetHolder, file_signature
+from bounded_cache import BoundedCache
+from boundary_index import BoundaryIndex
+from search_index import DEFAULT_SEARCH_LIMIT, MAX_SEARCH_LIMIT, SearchIndex
+from vector_tiles import read_tile
+from crop_store import CropStore, snapshot_is_current
+from crop_index import (
+    AGGREGATE_GROUPS, AGGREGATE_METRICS, DEFAULT_CHART_LIMIT, build_aggregates, build_crop_rankings,
+    build_crop_trends, build_growth_ranking, build_municipality_profiles, build_statistics, slice_ranking,
+    slice_trend
+)
+from metrics import (
+    API_ERRORS, CACHE_REQUESTS, CONTENT_TYPE as METRICS_CONTENT_TYPE, DATASET_LOAD_SECONDS, DATASET_RELOAD_ERRORS,
+    DATASET_VERSION, REGISTRY, REQUEST_LATENCY, REQUESTS, RESPONSE_SIZE
+)
+from profiling import save_report, start_profiler
+from crop_years import YEARS_INDEX_FILE, read_years_index, year_data_file, year_snapshot_file
 import json
 
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+CROP_DATA_FILE = 'data/crop_data_static.json'
+CROP_SNAPSHOT_FILE = 'data/crop_data_static.bin'
+# Optional {municipality_code: mesoregion name} mapping (IBGE codes do not encode the mesoregion)
+MESOREGIONS_FILE = 'data/ibge_mesoregions.json'
+BOUNDARIES_FILE = 'static/data/brazil_municipalities_all.geojson'
+# Simplified copies written by combine_geojson.py (full, high, medium, low)
+BOUNDARY_LEVEL_FILE = 'static/data/brazil_municipalities_{}.geojson'
+BOUNDARY_LEVELS = ('full', 'high', 'medium', 'low')
+VECTOR_TILES_FILE = 'data/municipalities.mbtiles'
+
+# Where the crop dataset is loaded from: 'json' (files under data/) or 'database' (crop_data table).
+# Either way it is read once per load and requests are answered from memory; the crop_data indexes
+# serve that load and direct SQL use (data_processor), not individual requests
+CROP_DATA_SOURCE = os.environ.get('CROP_DATA_SOURCE', 'json')
+VECTOR_TILE_MIMETYPE = 'application/vnd.mapbox-vector-tile'
+
+# Streaming output: records per chunk written to the socket
+NDJSON_MIMETYPE = 'application/x-ndjson'
+NDJSON_CHUNK_RECORDS = 200
+
+# Batch requests: crops per request, fields per crop, and filtered fragments kept per dataset version
+BATCH_MAX_CROPS = 20
+BATCH_FIELDS = ('data', 'chart_data')
+BATCH_CACHE_SIZE = 512
+# Batch responses are assembled per request, so they are compressed with a fast level
+BATCH_GZIP_LEVEL = 1
+
+# On-demand growth rankings (year pairs other than the latest two) kept per dataset version
+GROWTH_CACHE_SIZE = 256
+
+# Fraction of requests written to the structured request log (0 = off, the production default)
+REQUEST_LOG_SAMPLE_RATE = float(os.environ.get('REQUEST_LOG_SAMPLE_RATE', 0))
+request_logger = logging.getLogger('requests')
+
+# Fraction of requests profiled with reports saved under data/profiles/requests (0 = off); admins can
+# also profile a single request with ?__profile=1 and get the report back instead of the response
+PROFILE_REQUEST_RATE = float(os.environ.get('PROFILE_REQUEST_RATE', 0))
+# 'cprofile' or 'pyinstrument' (when installed)
+PROFILER_ENGINE = os.environ.get('PROFILER_ENGINE', 'cprofile')
+
+# Compression settings for the pre-serialized crop payloads (paid once per data load)
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 9
+
 # Load crop data
-def load_crop_data():
+def load_crop_data(data_file=CROP_DATA_FILE):
+    """Parsed crop data, empty when the file was not built yet
+
+    Parse errors are raised, so a reload of a corrupt file keeps the previous dataset.
+    """
     try:
-        with open('data/crop_data_static.json', 'r', encoding='utf-8') as f:
+        with open(data_file, 'r', encoding='utf-8') as f:
             return json.load(f)
     except FileNotFoundError:
-        print("Arquivo crop_data_static.json não encontrado")
+        print(f"Arquivo {os.path.basename(data_file)} não encontrado")
         return {}
-    except Exception as e:
-        print(f"Erro ao carregar dados: {e}")
+
+def load_crop_store(data_file=CROP_DATA_FILE, snapshot_file=CROP_SNAPSHOT_FILE):
+    """Map the binary snapshot when it matches the JSON file, otherwise parse the JSON"""
+    if snapshot_is_current(snapshot_file, data_file):
+        try:
+            return CropStore.from_snapshot(snapshot_file)
+        except Exception as e:
+            print(f"Erro ao carregar snapshot, usando JSON: {e}")
+    return CropStore.from_crop_data(load_crop_data(data_file))
+
+def load_mesoregions(mesoregions_file=MESOREGIONS_FILE):
+    """Mesoregion of each municipality code, empty when the mapping file is absent"""
+    try:
+        with open(mesoregions_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
         return {}
 
-CROP_DATA = load_crop_data()
+def get_data_file_mtime(data_file=CROP_DATA_FILE):
+    try:
+        return os.path.getmtime(data_file)
+    except OSError:
+        return None
+
+def serialize_fragment(value):
+    """Compact JSON bytes of one response member, spliced into larger payloads without re-serializing"""
+    return app.json.dumps(value, separators=(',', ':')).encode('utf-8')
+
+def wrap_fragment(field, fragment):
+    """Success response with a single pre-serialized member (same bytes jsonify would produce)"""
+    return b'{"' + field.encode('utf-8') + b'":' + fragment + b',"success":true}\n'
+
+def serialize_chart_fragments(rankings):
+    """Pre-serialize the default top-N chart data of every crop"""
+    return {
+        crop_name: serialize_fragment(slice_ranking(ranking))
+        for crop_name, ranking in rankings.items()
+    }
+
+def serialize_statistics(statistics, mtime):
+    """Pre-serialize the statistics response with its ETag and Last-Modified validators"""
+    payload = app.json.dumps({'success': True, **statistics}, separators=(',', ':')) + '\n'
+    return {
+        'payload': payload,
+        'etag': hashlib.sha1(payload.encode('utf-8')).hexdigest(),
+        'last_modified': datetime.fromtimestamp(mtime, tz=timezone.utc) if mtime else None
+    }
+
+def serialize_crop_payloads(store):
+    """Serialize every crop response once, with gzip and (if available) brotli variants"""
+    payloads = {}
+    for crop_name in store.crop_names():
+        data = serialize_fragment(store.crop_mapping(crop_name))
+        body = wrap_fragment('data', data)
+
+        # Insertion order is the server preference when the client accepts several
+        variants = {}
+        if brotli is not None:
+            variants['br'] = brotli.compress(body, quality=BROTLI_QUALITY)
+        variants['gzip'] = gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+        variants['identity'] = body
+
+        payloads[crop_name] = {
+            'etag': hashlib.sha1(body).hexdigest(),
+            'variants': variants,
+            # View into the response body, so batch requests reuse the bytes without a copy
+            'data': memoryview(body)[len(b'{"data":'):len(b'{"data":') + len(data)]
+        }
+    return payloads
+
+def load_years():
+    """Map every per-year dataset listed in the years index"""
+    return {
+        year: {'store': load_crop_store(year_data_file(year), year_snapshot_file(year))}
+        for year in read_years_index()
+    }
+
+def build_consecutive_growth(years):
+    """Growth rankings of every crop between each pair of consecutive years (year-over-year)"""
+    growth = {}
+    ordered = sorted(years)
+    for from_year, to_year in zip(ordered, ordered[1:]):
+        from_store, to_store = years[from_year]['store'], years[to_year]['store']
+        for crop_name in set(from_store.crop_names()) | set(to_store.crop_names()):
+            growth[(crop_name, from_year, to_year)] = build_growth_ranking(from_store, to_store, crop_name)
+    return growth
+
+def load_database_stores():
+    """Default store (latest year of each crop) and per-year stores read from the crop_data table"""
+    # Imported here so the JSON source never loads pandas and the ingestion modules
+    from data_processor import get_data_years, load_year_crop_data
+    year_data = {year: load_year_crop_data(year) for year in get_data_years()}
+    latest_crop_data = {}
+    for year in sorted(year_data):
+        latest_crop_data.update(year_data[year])
+    years = {year: {'store': CropStore.from_crop_data(crop_data)} for year, crop_data in year_data.items()}
+    return CropStore.from_crop_data(latest_crop_data), years
+
+def database_version():
+    """Reload signature of the database source"""
+    from data_processor import get_data_version
+    with app.app_context():
+        try:
+            return get_data_version()
+        except Exception as e:
+            print(f"Erro ao consultar versão dos dados: {e}")
+            return None
+
+def load_dataset():
+    """Load crop data and build every derived index and response cache for it"""
+    if CROP_DATA_SOURCE == 'database':
+        mtime = None
+        with app.app_context():
+            store, years = load_database_stores()
+    else:
+        mtime = get_data_file_mtime()
+        store = load_crop_store()
+        years = load_years()
+    rankings = build_crop_rankings(store)
+    chart_fragments = serialize_chart_fragments(rankings)
+    mesoregions = load_mesoregions()
+    return {
+        'mtime': mtime,
+        'store': store,
+        'rankings': rankings,
+        'chart_fragments': chart_fragments,
+        'chart_payloads': {
+            crop_name: wrap_fragment('chart_data', fragment) for crop_name, fragment in chart_fragments.items()
+        },
+        'statistics': serialize_statistics(build_statistics(store), mtime),
+        'crop_payloads': serialize_crop_payloads(store),
+        'years': years,
+        'trends': build_crop_trends({year: entry['store'] for year, entry in years.items()}),
+        'growth': build_consecutive_growth(years),
+        'growth_cache': BoundedCache('growth', GROWTH_CACHE_SIZE),
+        'fragment_cache': BoundedCache('batch_fragment', BATCH_CACHE_SIZE),
+        # Per-year indexes, built on first use of ?year= (a full set per year would double the load time)
+        'year_rankings': BoundedCache('year_rankings'),
+        'year_aggregates': BoundedCache('year_aggregates'),
+        'year_municipalities': BoundedCache('year_municipalities'),
+        'year_statistics': BoundedCache('year_statistics'),
+        'mesoregions': mesoregions,
+        'aggregates': build_aggregates(store, mesoregions),
+        'municipalities': build_municipality_profiles(store),
+        'search': SearchIndex.from_store(store)
+    }
+
+if CROP_DATA_SOURCE == 'database':
+    with app.app_context():
+        db.create_all()
+    # Rebuilt in the background after each finished load into the database
+    DATASETS = DatasetHolder(
+        load_dataset, [MESOREGIONS_FILE],
+        signature=lambda: (database_version(), file_signature([MESOREGIONS_FILE]))
+    )
+else:
+    # Rebuilt in the background when the JSON, snapshot, years index or mesoregions change on disk
+    DATASETS = DatasetHolder(load_dataset, [CROP_DATA_FILE, CROP_SNAPSHOT_FILE, YEARS_INDEX_FILE, MESOREGIONS_FILE])
+
+def watch_dataset_metrics(holder, name):
+    """Expose a holder's version, build time and failed reloads, read at scrape time"""
+    DATASET_VERSION.set_function(lambda: holder.version, dataset=name)
+    DATASET_LOAD_SECONDS.set_function(lambda: holder.current['load_seconds'], dataset=name)
+    DATASET_RELOAD_ERRORS.set_function(lambda: holder.reload_errors, dataset=name)
+
+watch_dataset_metrics(DATASETS, 'crops')
+
+def requested_year(dataset, name='year'):
+    """Year given in a query parameter (None when absent); it must be one of the loaded years"""
+    year = request.args.get(name, type=int)
+    if year is not None and year not in dataset['years']:
+        raise ValueError(f"Ano não disponível: {year}")
+    return year
+
+def requested_store(dataset):
+    """Store of ?year=, or the default dataset (latest year of each crop) without it"""
+    year = requested_year(dataset)
+    return dataset['store'] if year is None else dataset['years'][year]['store']
+
+def get_year_rankings(dataset, year):
+    """Crop rankings of one year, built on first use"""
+    return dataset['year_rankings'].get(year, lambda: build_crop_rankings(dataset['years'][year]['store']))
+
+def get_aggregates(dataset, year=None):
+    """Aggregates of the default dataset, or of one year built on first use"""
+    if year is None:
+        return dataset['aggregates']
+    return dataset['year_aggregates'].get(
+        year, lambda: build_aggregates(dataset['years'][year]['store'], dataset['mesoregions'])
+    )
+
+def get_municipality_profiles(dataset, year=None):
+    """Municipality profiles of the default dataset, or of one year built on first use"""
+    if year is None:
+        return dataset['municipalities']
+    return dataset['year_municipalities'].get(year, lambda: build_municipality_profiles(dataset['years'][year]['store']))
+
+def get_growth_ranking(dataset, crop_name, from_year, to_year):
+    """Growth ranking between two years: precomputed for consecutive years, cached for the others"""
+    key = (crop_name, from_year, to_year)
+    ranking = dataset['growth'].get(key)
+    if ranking is not None:
+        CACHE_REQUESTS.inc(cache='growth', result='precomputed')
+        return ranking
+    years = dataset['years']
+    return dataset['growth_cache'].get(
+        key, lambda: build_growth_ranking(years[from_year]['store'], years[to_year]['store'], crop_name)
+    )
+
+def get_crop_fragment(dataset, field, crop_name, year=None, state=None):
+    """Serialized data or chart_data of one crop: pre-serialized by default, cached for a year or state"""
+    if year is None and state is None:
+        CACHE_REQUESTS.inc(cache='batch_fragment', result='precomputed')
+        if field == 'data':
+            return dataset['crop_payloads'][crop_name]['data']
+        return dataset['chart_fragments'][crop_name]
+
+    def build():
+        if field == 'data':
+            store = dataset['store'] if year is None else dataset['years'][year]['store']
+            return serialize_fragment(store.crop_mapping(crop_name, state))
+        rankings = dataset['rankings'] if year is None else get_year_rankings(dataset, year)
+        return serialize_fragment(slice_ranking(rankings[crop_name], state=state))
+
+    return dataset['fragment_cache'].get((field, crop_name, year, state), build)
+
+def boundaries_file(level=None):
+    """GeoJSON file for a simplification level, falling back to the combined file"""
+    if level:
+        level_file = BOUNDARY_LEVEL_FILE.format(level)
+        if os.path.exists(level_file):
+            return level_file
+    return BOUNDARIES_FILE
+
+def load_boundaries(path=BOUNDARIES_FILE):
+    """Load municipality boundaries into a spatial index, empty when the file was not built yet
+
+    Parse errors are raised, so a reload of a corrupt file keeps the previous index.
+    """
+    try:
+        return {'index': BoundaryIndex.from_geojson(path)}
+    except FileNotFoundError:
+        print(f"Arquivo {os.path.basename(path)} não encontrado")
+        return {'index': BoundaryIndex([])}
+
+# Boundaries are only indexed on first use (one holder per file), then reloaded like the crop dataset
+BOUNDARIES = {}
+BOUNDARIES_LOCK = threading.Lock()
+
+def get_boundaries(level=None):
+    path = boundaries_file(level)
+    holder = BOUNDARIES.get(path)
+    if holder is None:
+        with BOUNDARIES_LOCK:
+            holder = BOUNDARIES.get(path)
+            if holder is None:
+                holder = BOUNDARIES[path] = DatasetHolder(lambda: load_boundaries(path), [path])
+                watch_dataset_metrics(holder, os.path.basename(path))
+    holder.check()
+    return holder.current
+
+def parse_bbox(value):
+    """Parse "min_lng,min_lat,max_lng,max_lat" into a bounds tuple"""
+    parts = [float(part) for part in value.split(',')]
+    if len(parts) != 4 or parts[0] > parts[2] or parts[1] > parts[3]:
+        raise ValueError('bbox deve ser min_lng,min_lat,max_lng,max_lat')
+    return tuple(parts)
+
+def api_error(message, status=200, kind='request'):
+    """Error response in the API's {success: false} shape, counted in api_errors_total"""
+    g.api_error = kind
+    return jsonify({'success': False, 'error': message}), status
+
+def api_exception(e, status=200):
+    """Error response for an exception caught in a route"""
+    # Invalid parameters are raised as ValueError (requested_year, parse_bbox); anything else is a failure
+    return api_error(str(e), status, 'request' if isinstance(e, ValueError) else 'exception')
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    """Latency, size, status and API errors per route; also runs for unhandled exceptions (500)"""
+    # The rule (not the path) keeps one series per endpoint
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    elapsed = time.perf_counter() - g.get('request_started', time.perf_counter())
+    REQUESTS.inc(route=route, method=request.method, status=response.status_code)
+    REQUEST_LATENCY.observe(elapsed, route=route)
+    if response.content_length is not None:
+        RESPONSE_SIZE.observe(response.content_length, route=route)
+    error = g.get('api_error')
+    if error:
+        API_ERRORS.inc(route=route, kind=error)
+
+    if REQUEST_LOG_SAMPLE_RATE and random.random() < REQUEST_LOG_SAMPLE_RATE:
+        dataset = g.get('dataset')
+        request_logger.info(json.dumps({
+            'method': request.method,
+            'route': route,
+            'path': request.path,
+            'status': response.status_code,
+            'duration_ms': round(elapsed * 1000, 3),
+            'size': response.content_length,
+            'error': error,
+            'dataset_version': dataset['version'] if dataset else None
+        }, ensure_ascii=False))
+    return response
+
+def is_admin():
+    admin_token = os.environ.get('ADMIN_TOKEN')
+    # Constant-time comparison, so response timing does not reveal how much of the token matched
+    return bool(admin_token) and hmac.compare_digest(
+        request.headers.get('X-Admin-Token', '').encode('utf-8'), admin_token.encode('utf-8')
+    )
+
+@app.before_request
+def start_request_profiler():
+    """Profile this request when asked (?__profile=1, admins only) or sampled by PROFILE_REQUEST_RATE"""
+    requested = request.args.get('__profile') == '1'
+    if requested and not is_admin():
+        return api_error('Não autorizado', 403)
+    if not requested and not (PROFILE_REQUEST_RATE and random.random() < PROFILE_REQUEST_RATE):
+        return None
+    # One profiler per process: a request arriving while another is profiled is served unprofiled
+    g.stop_profiler = start_profiler(PROFILER_ENGINE)
+    g.profile_requested = requested
+    if requested and g.stop_profiler is None:
+        return api_error('Outra requisição está sendo perfilada', 409)
+    return None
+
+@app.after_request
+def finish_request_profiler(response):
+    """Return (?__profile=1) or save the request's profile; streamed bodies are only profiled up to the first byte"""
+    stop = g.pop('stop_profiler', None)
+    if stop is None:
+        return response
+    report = stop()
+    if g.get('profile_requested'):
+        return app.response_class(report, content_type='text/plain; charset=utf-8')
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    save_report(report, f'{request.method} {route}')
+    return response
+
+@app.teardown_request
+def release_request_profiler(exception):
+    # Responses that never reached after_request must not keep the profiler busy
+    stop = g.pop('stop_profiler', None)
+    if stop is not None:
+        stop()
+
+@app.before_request
+def pin_dataset():
+    """Pin one dataset version for the whole request, even if a reload swaps it meanwhile"""
+    DATASETS.check()
+    g.dataset = DATASETS.current
 
 @app.route('/')
 def index():
@@ -60,85 +490,354 @@ def get_states():
             'states': states
         })
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e)})
+        return api_exception(e)
 
 @app.route('/api/statistics')
 def get_statistics():
     try:
-        # CROP_DATA structure: {crop_name: {municipality_code: {data}}}
-        total_crops = len(CROP_DATA)
-        
-        # Count unique municipalities across all crops
-        all_municipalities = set()
-        for crop_data in CROP_DATA.values():
-            all_municipalities.update(crop_data.keys())
-        
-        total_municipalities = len(all_municipalities)
+        dataset = g.dataset
+        year = requested_year(dataset)
+        if year is None:
+            statistics = dataset['statistics']
+        else:
+            statistics = dataset['year_statistics'].get(year, lambda: serialize_statistics(
+                build_statistics(dataset['years'][year]['store']), get_data_file_mtime(year_data_file(year))
+            ))
 
-        return jsonify({
-            'success': True,
-            'total_crops': total_crops,
-            'total_municipalities': total_municipalities
-        })
+        # Statistics are computed once per data load; answer 304 when the client copy is current
+        response = app.response_class(statistics['payload'], mimetype=app.json.mimetype)
+        response.set_etag(statistics['etag'])
+        response.last_modified = statistics['last_modified']
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e)})
+        return api_exception(e)
 
 @app.route('/api/crops')
 def get_crops():
     try:
-        # CROP_DATA structure: {crop_name: {municipality_code: {data}}}
-        sorted_crops = sorted(list(CROP_DATA.keys()))
+        sorted_crops = sorted(requested_store(g.dataset).crop_names())
         return jsonify({
             'success': True,
             'crops': sorted_crops
         })
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e)})
+        return api_exception(e)
+
+def wants_ndjson():
+    """True for ?format=ndjson or when the client prefers application/x-ndjson"""
+    if request.args.get('format') == 'ndjson':
+        return True
+    best = request.accept_mimetypes.best_match([app.json.mimetype, NDJSON_MIMETYPE])
+    return best == NDJSON_MIMETYPE
+
+def stream_crop_records(store, crop_name):
+    """Stream one JSON record per line straight from the store, without building the mapping"""
+    def generate():
+        lines = []
+        for municipality_code, municipality_name, state_code, harvested_area in store.iter_records(crop_name):
+            lines.append(json.dumps({
+                'municipality_code': municipality_code,
+                'municipality_name': municipality_name,
+                'state_code': state_code,
+                'harvested_area': harvested_area
+            }, ensure_ascii=False, separators=(',', ':')))
+            if len(lines) == NDJSON_CHUNK_RECORDS:
+                yield '\n'.join(lines) + '\n'
+                lines = []
+        if lines:
+            yield '\n'.join(lines) + '\n'
+
+    response = app.response_class(generate(), mimetype=NDJSON_MIMETYPE)
+    response.vary.add('Accept')
+    return response
 
 @app.route('/api/crop-data/<crop_name>')
 def get_crop_data(crop_name):
     try:
-        if crop_name not in CROP_DATA:
-            return jsonify({'success': False, 'error': 'Cultura não encontrada'})
+        if 'year' in request.args:
+            return get_year_crop_data(crop_name)
         
-        crop_municipalities = CROP_DATA[crop_name]
+        crop_payloads = g.dataset['crop_payloads']
+        if crop_name not in crop_payloads:
+            return api_error('Cultura não encontrada')
         
-        return jsonify({
-            'success': True,
-            'data': crop_municipalities
-        })
+        if wants_ndjson():
+            return stream_crop_records(g.dataset['store'], crop_name)
+        
+        payload = crop_payloads[crop_name]
+        encoding = request.accept_encodings.best_match(list(payload['variants']), default='identity')
+        
+        # Serve the cached bytes as-is; each encoding is its own representation with its own ETag
+        response = app.response_class(payload['variants'][encoding], mimetype=app.json.mimetype)
+        if encoding == 'identity':
+            response.set_etag(payload['etag'])
+        else:
+            response.headers['Content-Encoding'] = encoding
+            response.set_etag(f"{payload['etag']}-{encoding}")
+        response.vary.update(['Accept', 'Accept-Encoding'])
+        return response.make_conditional(request)
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e)})
+        return api_exception(e)
+
+@app.route('/api/crop-data/batch', methods=['POST'])
+def get_crop_data_batch():
+    try:
+        body = request.get_json(silent=True) or {}
+        crop_names = body.get('crops')
+        fields = body.get('fields') or list(BATCH_FIELDS)
+        state = body.get('state') or None
+        if not isinstance(crop_names, list) or not crop_names or not all(isinstance(name, str) for name in crop_names):
+            return api_error('Informe crops como uma lista de culturas')
+        if len(crop_names) > BATCH_MAX_CROPS:
+            return api_error(f"No máximo {BATCH_MAX_CROPS} culturas por requisição")
+        # Checked before any set() or cache key sees them: lists and dicts are not hashable
+        if not isinstance(fields, list) or not all(
+            isinstance(field, str) and field in BATCH_FIELDS for field in fields
+        ):
+            return api_error(f"fields deve conter apenas: {', '.join(BATCH_FIELDS)}")
+        if state is not None and not isinstance(state, str):
+            return api_error('state deve ser a sigla de um estado')
+        
+        dataset = g.dataset
+        year = requested_year(dataset)
+        store = dataset['store'] if year is None else dataset['years'][year]['store']
+        for crop_name in crop_names:
+            if crop_name not in store:
+                return api_error(f"Cultura não encontrada: {crop_name}")
+        
+        # Splice the serialized fragments of each crop into one response instead of dumping them again
+        parts = []
+        for crop_name in dict.fromkeys(crop_names):
+            parts.append(b',' if parts else b'{')
+            parts.append(serialize_fragment(crop_name) + b':{')
+            for i, field in enumerate(field for field in BATCH_FIELDS if field in fields):
+                parts.append((b',"' if i else b'"') + field.encode('utf-8') + b'":')
+                parts.append(get_crop_fragment(dataset, field, crop_name, year, state))
+            parts.append(b'}')
+        parts.append(b'}')
+        payload = wrap_fragment('crops', b''.join(parts))
+        
+        response = app.response_class(payload, mimetype=app.json.mimetype)
+        if 'gzip' in request.accept_encodings:
+            response.set_data(gzip.compress(payload, compresslevel=BATCH_GZIP_LEVEL, mtime=0))
+            response.headers['Content-Encoding'] = 'gzip'
+        response.vary.add('Accept-Encoding')
+        return response
+    except Exception as e:
+        return api_exception(e)
+
+def get_year_crop_data(crop_name):
+    """Crop data of one year (?year=); only the default dataset has pre-serialized payloads"""
+    store = requested_store(g.dataset)
+    if crop_name not in store:
+        return api_error('Cultura não encontrada')
+    if wants_ndjson():
+        return stream_crop_records(store, crop_name)
+    return jsonify({
+        'success': True,
+        'data': store.crop_mapping(crop_name)
+    })
 
 @app.route('/api/crop-chart-data/<crop_name>')
 def get_crop_chart_data(crop_name):
     try:
-        if crop_name not in CROP_DATA:
-            return jsonify({'success': False, 'error': 'Cultura não encontrada'})
+        dataset = g.dataset
+        year = requested_year(dataset)
+        from_year = requested_year(dataset, 'from')
+        to_year = requested_year(dataset, 'to')
+        store = dataset['store'] if year is None else dataset['years'][year]['store']
+        if crop_name not in store:
+            return api_error('Cultura não encontrada')
         
-        crop_municipalities = []
-        for municipality_code, municipality_data in CROP_DATA[crop_name].items():
-            crop_municipalities.append({
-                'municipality_name': municipality_data.get('municipality_name', 'Desconhecido'),
-                'state_code': municipality_data.get('state_code', 'XX'),
-                'harvested_area': municipality_data.get('harvested_area', 0)
-            })
-
-        # Sort by harvested area and take top 20
-        crop_municipalities.sort(key=lambda x: x['harvested_area'], reverse=True)
-        top_20 = crop_municipalities[:20]
-
-        chart_data = {
-            'labels': [f"{muni['municipality_name']} ({muni['state_code']})" for muni in top_20],
-            'data': [muni['harvested_area'] for muni in top_20]
-        }
+        limit = max(request.args.get('limit', DEFAULT_CHART_LIMIT, type=int), 0)
+        offset = max(request.args.get('offset', 0, type=int), 0)
+        state = request.args.get('state')
+
+        if from_year is not None or to_year is not None:
+            # ?from=&to= ranks municipalities by the change in area between the two years
+            if from_year is None or to_year is None or from_year >= to_year:
+                return api_error('Informe from e to, com from anterior a to')
+            ranking = get_growth_ranking(dataset, crop_name, from_year, to_year)
+        elif year is not None:
+            ranking = get_year_rankings(dataset, year)[crop_name]
+        elif limit == DEFAULT_CHART_LIMIT and offset == 0 and not state:
+            # Default top-N chart is served straight from the pre-serialized payload
+            CACHE_REQUESTS.inc(cache='chart_payload', result='precomputed')
+            return app.response_class(dataset['chart_payloads'][crop_name], mimetype=app.json.mimetype)
+        else:
+            ranking = dataset['rankings'][crop_name]
+
+        CACHE_REQUESTS.inc(cache='chart_payload', result='computed')
+        chart_data = slice_ranking(ranking, limit, offset, state)
 
         return jsonify({
             'success': True,
             'chart_data': chart_data
         })
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e)})
+        return api_exception(e)
+
+@app.route('/api/years')
+def get_years():
+    try:
+        years = sorted(g.dataset['years'])
+        return jsonify({
+            'success': True,
+            'years': years,
+            'latest': years[-1] if years else None
+        })
+    except Exception as e:
+        return api_exception(e)
+
+@app.route('/api/aggregate')
+def get_aggregate():
+    try:
+        dataset = g.dataset
+        crop_name = request.args.get('crop') or None
+        group_by = request.args.get('group_by', 'state')
+        metric = request.args.get('metric', 'sum')
+        if group_by not in AGGREGATE_GROUPS:
+            return api_error(f"group_by deve ser um de: {', '.join(AGGREGATE_GROUPS)}")
+        if metric not in AGGREGATE_METRICS:
+            return api_error(f"metric deve ser um de: {', '.join(AGGREGATE_METRICS)}")
+        
+        # Totals are precomputed per data load (per year on first use); only one metric is picked here
+        groups = get_aggregates(dataset, requested_year(dataset)).get(group_by)
+        if groups is None:
+            return api_error('Mesorregiões não disponíveis')
+        if crop_name not in groups:
+            return api_error('Cultura não encontrada')
+        
+        return jsonify({
+            'success': True,
+            'crop': crop_name,
+            'group_by': group_by,
+            'metric': metric,
+            'aggregates': groups[crop_name][metric]
+        })
+    except Exception as e:
+        return api_exception(e)
+
+@app.route('/api/municipality/<municipality_code>')
+def get_municipality(municipality_code):
+    try:
+        dataset = g.dataset
+        # Crop mix and state ranks are precomputed per data load; this is a single dict lookup
+        profile = get_municipality_profiles(dataset, requested_year(dataset)).get(municipality_code)
+        if profile is None:
+            return api_error('Município não encontrado')
+        return jsonify({
+            'success': True,
+            'municipality_code': municipality_code,
+            **profile
+        })
+    except Exception as e:
+        return api_exception(e)
+
+@app.route('/api/search')
+def search():
+    try:
+        query = request.args.get('q', '')
+        limit = min(max(request.args.get('limit', DEFAULT_SEARCH_LIMIT, type=int), 1), MAX_SEARCH_LIMIT)
+        # Built once per data load; prefix lookups are a binary search, misses fall back to near matches
+        results, fuzzy = g.dataset['search'].search(query, limit)
+        return jsonify({
+            'success': True,
+            'query': query,
+            'fuzzy': fuzzy,
+            'results': results
+        })
+    except Exception as e:
+        return api_exception(e)
+
+@app.route('/api/crop-trend/<crop_name>')
+def get_crop_trend(crop_name):
+    try:
+        dataset = g.dataset
+        trend = dataset['trends'].get(crop_name)
+        if trend is None:
+            return api_error('Cultura não encontrada')
+        
+        # Series and year-over-year changes are precomputed at load; only the window is cut here
+        trend = slice_trend(trend, requested_year(dataset, 'from'), requested_year(dataset, 'to'))
+        return jsonify({
+            'success': True,
+            'crop': crop_name,
+            'trend': trend
+        })
+    except Exception as e:
+        return api_exception(e)
+
+@app.route('/api/boundaries')
+def get_municipality_boundaries():
+    try:
+        state = request.args.get('state')
+        crop_name = request.args.get('crop')
+        bbox = request.args.get('bbox')
+        level = request.args.get('level')
+
+        if level and level not in BOUNDARY_LEVELS:
+            return api_error(f"level deve ser um de: {', '.join(BOUNDARY_LEVELS)}")
+
+        try:
+            bbox = parse_bbox(bbox) if bbox else None
+        except ValueError as e:
+            return api_error(str(e))
+
+        areas_by_code = None
+        if crop_name:
+            store = requested_store(g.dataset)
+            if crop_name not in store:
+                return api_error('Cultura não encontrada')
+            areas_by_code = store.crop_areas(crop_name)
+
+        # Only the municipalities in the requested state/viewport, with the crop's areas joined in
+        index = get_boundaries(level)['index']
+        feature_ids = index.query(bbox=bbox, state=state)
+        return app.response_class(index.feature_collection_json(feature_ids, areas_by_code), mimetype=app.json.mimetype)
+    except Exception as e:
+        return api_exception(e)
+
+@app.route('/tiles/<int:z>/<int:x>/<int:y>.pbf')
+def get_vector_tile(z, x, y):
+    try:
+        tile_data = read_tile(VECTOR_TILES_FILE, z, x, y)
+    except Exception as e:
+        return api_exception(e, 404)
+
+    if tile_data is None:
+        return '', 204
+
+    # Tiles are stored gzipped; only decompress for clients that cannot take gzip
+    if request.accept_encodings['gzip']:
+        response = app.response_class(tile_data, mimetype=VECTOR_TILE_MIMETYPE)
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = app.response_class(gzip.decompress(tile_data), mimetype=VECTOR_TILE_MIMETYPE)
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.max_age = 86400
+    return response
+
+@app.route('/metrics')
+def get_metrics():
+    return app.response_class(REGISTRY.render(), content_type=METRICS_CONTENT_TYPE)
+
+@app.route('/api/admin/reload', methods=['POST'])
+def reload_dataset():
+    if not is_admin():
+        return api_error('Não autorizado', 403)
+
+    try:
+        # ?wait=1 blocks until the new version is published
+        version = DATASETS.reload(wait=request.args.get('wait') == '1')
+        return jsonify({
+            'success': True,
+            'version': version
+        })
+    except Exception as e:
+        return api_exception(e)
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
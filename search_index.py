@@ -0,0 +1,169 @@
+import unicodedata
+from bisect import bisect_left
+from bounded_cache import BoundedCache
+from crop_store import is_municipality_code
+
+DEFAULT_SEARCH_LIMIT = 10
+MAX_SEARCH_LIMIT = 50
+# Shortest query that gets the fuzzy fallback, and the edits allowed by query length
+FUZZY_MIN_LENGTH = 3
+FUZZY_LONG_QUERY = 7
+# Leading characters that must match exactly in fuzzy search (keeps the fallback to a fraction of the keys)
+FUZZY_PREFIX_LENGTH = 1
+# Fuzzy results kept per index (typos repeat across users; prefix lookups need no cache)
+FUZZY_CACHE_SIZE = 1024
+
+def fold(text):
+    """Accent- and case-folded form used for keys and queries ("Não-Me-Toque" -> "nao me toque")"""
+    decomposed = unicodedata.normalize('NFKD', text)
+    stripped = ''.join(char for char in decomposed if not unicodedata.combining(char)).casefold()
+    return ' '.join(''.join(char if char.isalnum() else ' ' for char in stripped).split())
+
+def common_prefix_length(a, b):
+    length = 0
+    for char_a, char_b in zip(a, b):
+        if char_a != char_b:
+            break
+        length += 1
+    return length
+
+def max_edits_for(query):
+    return 1 if len(query) < FUZZY_LONG_QUERY else 2
+
+class SearchIndex:
+    """Prefix and fuzzy-prefix search over municipality and crop names
+
+    Every word start of every folded name is a key in one sorted array, so a
+    prefix is a contiguous range found by binary search. The fuzzy fallback walks
+    the same array as an implicit trie: Levenshtein rows are shared between keys
+    with a common prefix and whole prefix ranges are skipped once they exceed the
+    edit bound. The key arrays never change once built and the fuzzy result cache
+    is a locked BoundedCache, so the index can be shared between threads.
+    """
+
+    def __init__(self, results):
+        self.results = results
+        entries = []
+        for result_id, result in enumerate(results):
+            words = fold(result['name']).split(' ')
+            for position in range(len(words)):
+                entries.append((' '.join(words[position:]), position > 0, result_id))
+        entries.sort()
+        self._keys = [key for key, _, _ in entries]
+        self._word_matches = [word_match for _, word_match, _ in entries]
+        self._result_ids = [result_id for _, _, result_id in entries]
+        self._fuzzy_cache = BoundedCache('search_fuzzy', FUZZY_CACHE_SIZE)
+
+    @classmethod
+    def from_store(cls, store):
+        """Index the crops and municipalities of a crop store (skipping codes that are not municipalities)"""
+        results = [{'type': 'crop', 'name': crop_name} for crop_name in sorted(store.crop_names())]
+        seen = set()
+        for code, name, state_code in zip(store.codes, store.names, store.states):
+            if is_municipality_code(code) and code not in seen:
+                seen.add(code)
+                results.append({'type': 'municipality', 'code': code, 'name': name, 'state_code': state_code})
+        return cls(results)
+
+    def __len__(self):
+        return len(self.results)
+
+    def _prefix_range(self, prefix):
+        start = bisect_left(self._keys, prefix)
+        return start, bisect_left(self._keys, prefix + '\uffff', start)
+
+    def prefix_search(self, query, limit=DEFAULT_SEARCH_LIMIT):
+        """Result ids whose name, or one of its words, starts with the query; full-name matches first"""
+        start, end = self._prefix_range(query)
+        name_matches = []
+        word_matches = []
+        seen = set()
+        for i in range(start, end):
+            result_id = self._result_ids[i]
+            if result_id in seen:
+                continue
+            if self._word_matches[i]:
+                if len(word_matches) < limit:
+                    word_matches.append(result_id)
+                    seen.add(result_id)
+            else:
+                name_matches.append(result_id)
+                seen.add(result_id)
+                if len(name_matches) == limit:
+                    break
+        return (name_matches + word_matches)[:limit]
+
+    def fuzzy_search(self, query, max_edits, limit=DEFAULT_SEARCH_LIMIT):
+        """Result ids with a name or word prefix within max_edits of the query, closest first
+
+        The first FUZZY_PREFIX_LENGTH characters must match exactly.
+        """
+        keys = self._keys
+        i, keys_end = self._prefix_range(query[:FUZZY_PREFIX_LENGTH])
+        size = len(query)
+        max_depth = size + max_edits
+        # Cells outside the diagonal band are never within max_edits; they stay at the cap
+        cap = max_edits + 1
+        # rows[d] is the edit distance row after d key characters, bests[d] the best prefix distance so far
+        rows = [[min(j, cap) for j in range(size + 1)]]
+        bests = [rows[0][-1]]
+        previous = ''
+        distances = {}
+        while i < keys_end:
+            key = keys[i]
+            # Rows for the prefix shared with the previous key are still valid
+            depth = min(common_prefix_length(previous, key), len(rows) - 1)
+            del rows[depth + 1:]
+            del bests[depth + 1:]
+            previous = key
+            skip_to = None
+            while depth < min(len(key), max_depth):
+                char = key[depth]
+                above = rows[-1]
+                depth += 1
+                row = [cap] * (size + 1)
+                row[0] = lowest = depth if depth < cap else cap
+                # Inlined min() of substitution, deletion and insertion: this loop is the whole cost
+                for j in range(max(1, depth - max_edits), min(size, depth + max_edits) + 1):
+                    value = above[j - 1] if query[j - 1] == char else above[j - 1] + 1
+                    if above[j] < value:
+                        value = above[j] + 1
+                    if row[j - 1] < value:
+                        value = row[j - 1] + 1
+                    if value > cap:
+                        value = cap
+                    row[j] = value
+                    if value < lowest:
+                        lowest = value
+                rows.append(row)
+                bests.append(min(bests[-1], row[-1]))
+                if lowest > max_edits:
+                    # No key starting with this prefix can come back within the bound
+                    skip_to = bisect_left(keys, key[:depth] + '\uffff', i, keys_end)
+                    break
+
+            end = skip_to if skip_to is not None else i + 1
+            if bests[-1] <= max_edits:
+                # A skipped range shares the prefix that already matched
+                for k in range(i, end):
+                    result_id = self._result_ids[k]
+                    distance = bests[-1] + self._word_matches[k]
+                    if distance < distances.get(result_id, max_edits + 2):
+                        distances[result_id] = distance
+            i = end
+
+        ranked = sorted(distances, key=lambda result_id: (distances[result_id], fold(self.results[result_id]['name'])))
+        return ranked[:limit]
+
+    def search(self, text, limit=DEFAULT_SEARCH_LIMIT):
+        """(results, fuzzy) for a typeahead query: prefix matches, or near matches when there are none"""
+        query = fold(text)
+        if not query:
+            return [], False
+        result_ids = self.prefix_search(query, limit)
+        fuzzy = not result_ids and len(query) >= FUZZY_MIN_LENGTH
+        if fuzzy:
+            result_ids = self._fuzzy_cache.get(
+                (query, limit), lambda: self.fuzzy_search(query, max_edits_for(query), limit)
+            )
+        return [self.results[result_id] for result_id in result_ids], fuzzy
@@ -97,8 +97,16 @@ function loadMunicipalityBoundaries(cropName) {
         map.removeLayer(currentLayer);
     }
 
-    // Try to load the most complete GeoJSON file available
+    // Prefer the server-side filtered boundaries (state + crop areas joined in),
+    // then fall back to the most complete GeoJSON file available
+    // National view uses the coarsest simplified level, a single state the medium one
+    const boundaryParams = new URLSearchParams({ crop: cropName, level: 'low' });
+    if (currentStateFilter) {
+        boundaryParams.set('state', currentStateFilter);
+        boundaryParams.set('level', 'medium');
+    }
     const geoJsonFiles = [
+        `/api/boundaries?${boundaryParams}`,
         '/static/data/brazil_municipalities_all.geojson',
         '/attached_assets/brazil_municipalities_all_1752980285489.geojson',
         '/static/data/brazil_municipalities_combined.geojson',
@@ -114,6 +122,9 @@ function loadMunicipalityBoundaries(cropName) {
                 const response = await fetch(filePath);
                 if (response.ok) {
                     const geoData = await response.json();
+                    if (!geoData.features || geoData.features.length === 0) {
+                        continue;
+                    }
                     console.log(`GeoJSON carregado com sucesso: ${filePath}, ${geoData.features.length} municípios`);
                     
                     // Store all municipalities data
@@ -203,7 +214,8 @@ function createFallbackVisualization(cropName) {
 
 function getFeatureStyle(feature, cropName) {
     // Try multiple ways to get municipality code from GeoJSON
-    const municipalityCode = feature.properties.GEOCODIGO || 
+    const municipalityCode = feature.properties.municipality_code ||
+                           feature.properties.GEOCODIGO || 
                            feature.properties.CD_MUN || 
                            feature.properties.cd_geocmu || 
                            feature.properties.geocodigo ||
@@ -236,9 +248,9 @@ function getFeatureStyle(feature, cropName) {
 
 function setupFeaturePopup(feature, layer, cropName) {
     // Try multiple ways to get municipality info from GeoJSON
-    const municipalityCode = feature.properties.GEOCODIGO || feature.properties.CD_MUN || feature.properties.cd_geocmu || feature.properties.geocodigo;
-    const municipalityName = feature.properties.NOME || feature.properties.NM_MUN || feature.properties.nm_mun || feature.properties.nome || 'Nome não disponível';
-    const stateUF = feature.properties.UF || feature.properties.SIGLA_UF || feature.properties.uf;
+    const municipalityCode = feature.properties.municipality_code || feature.properties.GEOCODIGO || feature.properties.CD_MUN || feature.properties.cd_geocmu || feature.properties.geocodigo;
+    const municipalityName = feature.properties.municipality_name || feature.properties.NOME || feature.properties.NM_MUN || feature.properties.nm_mun || feature.properties.nome || 'Nome não disponível';
+    const stateUF = feature.properties.state_code || feature.properties.UF || feature.properties.SIGLA_UF || feature.properties.uf;
     const cropData = currentCropData[municipalityCode];
 
     let popupContent = `<strong>${municipalityName}</strong>`;
@@ -512,7 +524,7 @@ function applyStateFilter(geoData) {
     }
     
     const filteredFeatures = geoData.features.filter(feature => {
-        const stateUF = feature.properties.UF || feature.properties.SIGLA_UF || feature.properties.uf;
+        const stateUF = feature.properties.state_code || feature.properties.UF || feature.properties.SIGLA_UF || feature.properties.uf;
         return stateUF === currentStateFilter;
     });
     
@@ -525,40 +537,9 @@ function applyStateFilter(geoData) {
 function filterByStateOnMap(stateCode) {
     currentStateFilter = stateCode;
     
-    // If we have loaded data and a crop is selected, reload the layer with the filter
-    if (allMunicipalitiesData && currentCropName) {
-        // Remove existing layer
-        if (currentLayer) {
-            map.removeLayer(currentLayer);
-        }
-        
-        // Apply state filter
-        const filteredData = applyStateFilter(allMunicipalitiesData);
-        
-        // Create new layer with filtered data
-        currentLayer = L.geoJSON(filteredData, {
-            style: function(feature) {
-                return getFeatureStyle(feature, currentCropName);
-            },
-            onEachFeature: function(feature, layer) {
-                setupFeaturePopup(feature, layer, currentCropName);
-            }
-        }).addTo(map);
-
-        // Fit map to layer bounds (focused on filtered state if applicable)
-        if (currentLayer.getBounds().isValid()) {
-            map.fitBounds(currentLayer.getBounds());
-        } else if (!stateCode) {
-            // If no state filter, reset to Brazil bounds
-            const brazilBounds = [
-                [-33.7683777809, -73.98283055299],  // Southwest
-                [5.2842873834, -28.84765906699]     // Northeast  
-            ];
-            map.fitBounds(brazilBounds);
-        }
-
-        // Update legend
-        updateMapLegend(currentCropName);
+    // Boundaries are filtered by state on the server, so reload the layer for the new state
+    if (currentCropName) {
+        loadMunicipalityBoundaries(currentCropName);
     }
 }
 
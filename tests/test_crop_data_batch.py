@@ -0,0 +1,128 @@
+import gzip
+import json
+import os
+import sys
+import pytest
+from crop_index import build_crop_rankings, slice_ranking
+
+def municipality(name, state_code, harvested_area):
+    return {'municipality_name': name, 'state_code': state_code, 'harvested_area': harvested_area}
+
+# Names with accents, quotes and a backslash check that the spliced fragments are escaped like jsonify
+CROP_DATA = {
+    2023: {
+        'Feijão (em grão)': {
+            '3550308': municipality('São Paulo', 'SP', 120.0),
+            '1505502': municipality("Pau D'Arco", 'PA', 35.5),
+            '3106200': municipality('Belo Horizonte', 'MG', 12.0)
+        },
+        'Soja (em grão)': {
+            '5103403': municipality('Cuiabá', 'MT', 9800.0),
+            '3550308': municipality('São Paulo', 'SP', 10.0)
+        }
+    },
+    2024: {
+        'Feijão (em grão)': {
+            '3550308': municipality('São Paulo', 'SP', 150.0),
+            '1505502': municipality("Pau D'Arco", 'PA', 30.0),
+            '2910800': municipality('Feira de "Santana" \\ BA', 'BA', 75.25)
+        },
+        'Soja (em grão)': {
+            '5103403': municipality('Cuiabá', 'MT', 10200.0)
+        },
+        'Milho (em grão)': {
+            '5103403': municipality('Cuiabá', 'MT', 4000.0),
+            '3106200': municipality('Belo Horizonte', 'MG', 1.5)
+        }
+    }
+}
+CROPS = ['Feijão (em grão)', 'Soja (em grão)', 'Milho (em grão)']
+
+@pytest.fixture(scope='module')
+def client(tmp_path_factory):
+    """Test client of the app, loaded from a small dataset written in a temporary directory"""
+    work_dir = tmp_path_factory.mktemp('crop_data')
+    previous_dir = os.getcwd()
+    os.chdir(work_dir)
+    try:
+        from crop_years import write_year_dataset, write_years_index
+        for year, crop_data in CROP_DATA.items():
+            write_year_dataset(year, crop_data)
+        write_years_index(list(CROP_DATA))
+        latest = {crop_name: data for crop_data in CROP_DATA.values() for crop_name, data in crop_data.items()}
+        with open('data/crop_data_static.json', 'w', encoding='utf-8') as f:
+            json.dump(latest, f, ensure_ascii=False)
+
+        # routes reads the dataset on import, relative to the working directory
+        assert 'routes' not in sys.modules
+        from app import app
+        yield app.test_client()
+    finally:
+        os.chdir(previous_dir)
+
+def batch(client, **body):
+    response = client.post('/api/crop-data/batch', json=body)
+    assert response.status_code == 200
+    return response
+
+def expected_crops(crop_names, crop_data, fields=('data', 'chart_data'), state=None):
+    """What jsonify returns for the same crops, built without the pre-serialized fragments"""
+    from app import app
+    from crop_store import CropStore
+    from flask import jsonify
+    store = CropStore.from_crop_data(crop_data)
+    rankings = build_crop_rankings(store)
+    crops = {}
+    for crop_name in crop_names:
+        crops[crop_name] = {}
+        if 'data' in fields:
+            crops[crop_name]['data'] = store.crop_mapping(crop_name, state)
+        if 'chart_data' in fields:
+            crops[crop_name]['chart_data'] = slice_ranking(rankings[crop_name], state=state)
+    with app.test_request_context():
+        return jsonify({'success': True, 'crops': crops}).get_json()
+
+def test_matches_single_crop_responses(client):
+    payload = batch(client, crops=CROPS).get_json()
+    assert payload['success'] is True
+    assert list(payload['crops']) == CROPS
+    for crop_name in CROPS:
+        data = client.get(f'/api/crop-data/{crop_name}').get_json()['data']
+        chart_data = client.get(f'/api/crop-chart-data/{crop_name}').get_json()['chart_data']
+        assert payload['crops'][crop_name] == {'data': data, 'chart_data': chart_data}
+
+def test_matches_jsonify(client):
+    latest = {crop_name: data for crop_data in CROP_DATA.values() for crop_name, data in crop_data.items()}
+    assert batch(client, crops=CROPS).get_json() == expected_crops(CROPS, latest)
+
+def test_year_state_and_fields_match_jsonify(client):
+    crop_names = ['Soja (em grão)', 'Feijão (em grão)']
+    response = batch(client, crops=crop_names, state='SP', fields=['chart_data'])
+    assert response.get_json() == expected_crops(crop_names, CROP_DATA[2024], ['chart_data'], 'SP')
+
+    response = client.post('/api/crop-data/batch?year=2023', json={'crops': crop_names, 'state': 'SP'})
+    assert response.get_json() == expected_crops(crop_names, CROP_DATA[2023], state='SP')
+
+def test_duplicates_and_gzip(client):
+    identity = batch(client, crops=CROPS + CROPS[:1])
+    assert list(identity.get_json()['crops']) == CROPS
+
+    response = client.post(
+        '/api/crop-data/batch', json={'crops': CROPS + CROPS[:1]}, headers={'Accept-Encoding': 'gzip'}
+    )
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(response.get_data()) == identity.get_data()
+
+def test_unknown_crop(client):
+    payload = client.post('/api/crop-data/batch', json={'crops': ['Trigo (em grão)']}).get_json()
+    assert payload == {'success': False, 'error': 'Cultura não encontrada: Trigo (em grão)'}
+
+@pytest.mark.parametrize('body, error', [
+    ({'crops': 'Soja (em grão)'}, 'Informe crops como uma lista de culturas'),
+    ({'crops': CROPS, 'fields': [{}]}, 'fields deve conter apenas: data, chart_data'),
+    ({'crops': CROPS, 'fields': ['area']}, 'fields deve conter apenas: data, chart_data'),
+    ({'crops': CROPS, 'state': ['SP']}, 'state deve ser a sigla de um estado')
+])
+def test_invalid_body(client, body, error):
+    payload = client.post('/api/crop-data/batch', json=body).get_json()
+    assert payload == {'success': False, 'error': error}
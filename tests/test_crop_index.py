@@ -0,0 +1,70 @@
+from crop_index import (
+    build_aggregates, build_crop_trends, build_growth_ranking, build_municipality_profiles, build_statistics
+)
+from crop_store import CropStore, is_municipality_code
+
+def municipality(name, state_code, harvested_area):
+    return {'municipality_name': name, 'state_code': state_code, 'harvested_area': harvested_area}
+
+# The IBGE sheets list a total row for each mesoregion (4 digits) and microregion (5 digits) next to the
+# municipalities; padded to 7 digits they start with "00"
+CROP_DATA = {
+    'Soja (em grão)': {
+        '5107909': municipality('Sorriso', 'MT', 600.0),
+        '5106240': municipality('Nova Ubiratã', 'MT', 400.0),
+        '0005101': municipality('Norte Mato-grossense', 'MT', 1000.0),
+        '0051001': municipality('Alto Teles Pires', 'MT', 1000.0),
+        '4104808': municipality('Cascavel', 'PR', 300.0),
+        '0004106': municipality('Oeste Paranaense', 'PR', 300.0)
+    },
+    'Milho (em grão)': {
+        '5107909': municipality('Sorriso', 'MT', 200.0),
+        '0005101': municipality('Norte Mato-grossense', 'MT', 200.0)
+    }
+}
+
+def test_is_municipality_code():
+    assert is_municipality_code('5107909')
+    assert not is_municipality_code('0005101')
+    assert not is_municipality_code('5101')
+    assert not is_municipality_code('9907909')
+
+def test_aggregates_skip_regional_totals():
+    aggregates = build_aggregates(CropStore.from_crop_data(CROP_DATA))
+    by_state = aggregates['state']['Soja (em grão)']
+    assert dict(zip(by_state['sum']['labels'], by_state['sum']['data'])) == {'MT': 1000.0, 'PR': 300.0}
+    assert dict(zip(by_state['count']['labels'], by_state['count']['data'])) == {'MT': 2, 'PR': 1}
+    all_crops = aggregates['region'][None]['sum']
+    assert dict(zip(all_crops['labels'], all_crops['data'])) == {'Centro-Oeste': 1200.0, 'Sul': 300.0}
+    assert aggregates['crop'][None]['sum']['data'] == [1300.0, 200.0]
+
+def test_statistics_skip_regional_totals():
+    statistics = build_statistics(CropStore.from_crop_data(CROP_DATA))
+    assert statistics['total_municipalities'] == 3
+    assert statistics['total_records'] == 4
+    assert statistics['hectares_by_crop'] == {'Soja (em grão)': 1300.0, 'Milho (em grão)': 200.0}
+    assert statistics['states'] == {'MT': {'municipalities': 2, 'records': 3}, 'PR': {'municipalities': 1, 'records': 1}}
+
+def test_trends_and_growth_skip_regional_totals():
+    later = {crop_name: dict(municipalities) for crop_name, municipalities in CROP_DATA.items()}
+    later['Soja (em grão)']['5107909'] = municipality('Sorriso', 'MT', 900.0)
+    later['Soja (em grão)']['0005101'] = municipality('Norte Mato-grossense', 'MT', 1300.0)
+    stores = {2023: CropStore.from_crop_data(CROP_DATA), 2024: CropStore.from_crop_data(later)}
+
+    trend = build_crop_trends(stores)['Soja (em grão)']
+    assert trend['total_area'] == [1300.0, 1600.0]
+    assert trend['municipalities'] == [3, 3]
+    assert trend['delta'] == [None, 300.0]
+
+    ranking = build_growth_ranking(stores[2023], stores[2024], 'Soja (em grão)')
+    assert ranking['labels'] == ['Sorriso (MT)', 'Nova Ubiratã (MT)', 'Cascavel (PR)']
+    assert ranking['data'] == [300.0, 0.0, 0.0]
+    assert ranking['states']['MT']['labels'] == ['Sorriso (MT)', 'Nova Ubiratã (MT)']
+
+def test_profiles_skip_regional_totals():
+    profiles = build_municipality_profiles(CropStore.from_crop_data(CROP_DATA))
+    assert set(profiles) == {'5107909', '5106240', '4104808'}
+    soy = profiles['5107909']['crops'][0]
+    assert (soy['crop'], soy['state_rank'], soy['state_municipalities']) == ('Soja (em grão)', 1, 2)
+    cascavel = profiles['4104808']['crops'][0]
+    assert (cascavel['state_rank'], cascavel['state_municipalities']) == (1, 1)
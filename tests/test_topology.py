@@ -0,0 +1,99 @@
+import io
+import json
+import pytest
+from topology import Topology
+
+def feature(code, geometry):
+    return {'type': 'Feature', 'properties': {'CD_MUN': code}, 'geometry': geometry}
+
+# Wavy border shared by the first two municipalities (simplification straightens it)
+BORDER = [[-49.0, -20.0], [-48.998, -19.75], [-49.002, -19.5], [-48.997, -19.25], [-49.0, -19.0]]
+
+FEATURES = [
+    feature('1', {'type': 'Polygon', 'coordinates': [[[-50.0, -20.0]] + BORDER + [[-50.0, -19.0], [-50.0, -20.0]]]}),
+    feature('2', {'type': 'Polygon', 'coordinates': [BORDER[::-1] + [[-48.0, -20.0], [-48.0, -19.0], [-49.0, -19.0]]]}),
+    # Island with a hole, and a municipality in two parts
+    feature('3', {'type': 'Polygon', 'coordinates': [
+        [[-45.0, -15.0], [-44.0, -15.0], [-44.0, -14.0], [-45.0, -14.0], [-45.0, -15.0]],
+        [[-44.8, -14.8], [-44.8, -14.2], [-44.2, -14.2], [-44.2, -14.8], [-44.8, -14.8]]
+    ]}),
+    feature('4', {'type': 'MultiPolygon', 'coordinates': [
+        [[[-40.0, -10.0], [-39.5, -10.0], [-39.5, -9.5], [-40.0, -10.0]]],
+        [[[-39.0, -10.0], [-38.5, -10.0], [-38.5, -9.5], [-39.0, -10.0]]]
+    ]})
+]
+
+def decode_topojson(document, object_name='municipalities'):
+    """GeoJSON-style geometries of a quantized TopoJSON object, decoded as the TopoJSON spec describes"""
+    scale_x, scale_y = document['transform']['scale']
+    translate_x, translate_y = document['transform']['translate']
+    arcs = []
+    for encoded in document['arcs']:
+        x = y = 0
+        points = []
+        for dx, dy in encoded:
+            x, y = x + dx, y + dy
+            points.append([x * scale_x + translate_x, y * scale_y + translate_y])
+        arcs.append(points)
+
+    def ring(refs):
+        points = []
+        for ref in refs:
+            arc = arcs[ref] if ref >= 0 else arcs[~ref][::-1]
+            points.extend(arc if not points else arc[1:])
+        return points
+
+    geometries = []
+    for geometry in document['objects'][object_name]['geometries']:
+        if geometry['type'] == 'Polygon':
+            coordinates = [ring(refs) for refs in geometry['arcs']]
+        elif geometry['type'] == 'MultiPolygon':
+            coordinates = [[ring(refs) for refs in polygon] for polygon in geometry['arcs']]
+        else:
+            coordinates = None
+        geometries.append((geometry['type'], coordinates, geometry['properties']))
+    return geometries
+
+def rounded(coordinates, decimals):
+    if isinstance(coordinates[0], (int, float)):
+        return [round(value, decimals) for value in coordinates]
+    return [rounded(item, decimals) for item in coordinates]
+
+@pytest.mark.parametrize('tolerance', [0, 0.01])
+@pytest.mark.parametrize('decimals', [5, 3])
+def test_topojson_matches_geojson(tolerance, decimals):
+    topology = Topology(FEATURES)
+    arcs = topology.simplified_arcs(tolerance)
+    f = io.StringIO()
+    topology.write_topojson(arcs, decimals, f)
+    decoded = decode_topojson(json.loads(f.getvalue()))
+
+    features = list(topology.iter_geojson_features(arcs, decimals))
+    assert len(decoded) == len(features)
+    for (geometry_type, coordinates, properties), expected in zip(decoded, features):
+        assert geometry_type == expected['geometry']['type']
+        assert properties == expected['properties']
+        assert rounded(coordinates, decimals) == expected['geometry']['coordinates']
+
+def test_shared_border_is_one_arc():
+    topology = Topology(FEATURES)
+    f = io.StringIO()
+    topology.write_topojson(topology.simplified_arcs(0.01), 5, f)
+    geometries = json.loads(f.getvalue())['objects']['municipalities']['geometries']
+    first, second = ({ref if ref >= 0 else ~ref for ref in geometry['arcs'][0]} for geometry in geometries[:2])
+    shared = first & second
+    assert len(shared) == 1
+    # Stored once, used forwards by one side and reversed by the other
+    (index,) = shared
+    assert {index, ~index} <= set(geometries[0]['arcs'][0]) | set(geometries[1]['arcs'][0])
+
+def test_simplified_border_stays_shared():
+    topology = Topology(FEATURES)
+    first, second = list(topology.iter_geojson_features(topology.simplified_arcs(0.01), 5))[:2]
+    first_border, second_border = (
+        {tuple(point) for point in geometry['coordinates'][0] if -49.01 < point[0] < -48.99}
+        for geometry in (first['geometry'], second['geometry'])
+    )
+    # Both sides drop the same vertices of the wavy border, so no gap or overlap opens
+    assert first_border == second_border
+    assert len(first_border) < len(BORDER)
@@ -0,0 +1,105 @@
+import gzip
+import json
+import pytest
+from vector_tiles import LAYER_NAME, TILE_BUFFER, TILE_EXTENT, build_vector_tiles, project, read_tile
+
+mapbox_vector_tile = pytest.importorskip('mapbox_vector_tile')
+
+ZOOM = 4
+
+def square(min_lng, min_lat, max_lng, max_lat):
+    return [[min_lng, min_lat], [max_lng, min_lat], [max_lng, max_lat], [min_lng, max_lat], [min_lng, min_lat]]
+
+FEATURES = [
+    {
+        'type': 'Feature',
+        'properties': {'CD_MUN': '3550308', 'NM_MUN': 'São Paulo', 'SIGLA_UF': 'SP'},
+        'geometry': {'type': 'Polygon', 'coordinates': [square(-47, -24, -46, -23), square(-46.8, -23.8, -46.2, -23.2)]}
+    },
+    {
+        # No state property: derived from the IBGE code prefix
+        'type': 'Feature',
+        'properties': {'CD_MUN': '3509502', 'NM_MUN': 'Campinas'},
+        'geometry': {'type': 'MultiPolygon', 'coordinates': [
+            [square(-48, -24, -47.5, -23.5)], [square(-47.4, -22.9, -47.1, -22.6)]
+        ]}
+    },
+    {
+        # Crosses the western tile border, so it is clipped to the tile buffer
+        'type': 'Feature',
+        'properties': {'CD_MUN': '5002704', 'NM_MUN': 'Campo Grande', 'SIGLA_UF': 'MS'},
+        'geometry': {'type': 'Polygon', 'coordinates': [square(-70, -23, -54, -22)]}
+    }
+]
+
+def tile_address(lng, lat):
+    x, y = project(lng, lat)
+    return int(x * 2 ** ZOOM), int(y * 2 ** ZOOM)
+
+def tile_point(lng, lat, tile_x, tile_y):
+    x, y = project(lng, lat)
+    scale = 2 ** ZOOM * TILE_EXTENT
+    return round(x * scale - tile_x * TILE_EXTENT), round(y * scale - tile_y * TILE_EXTENT)
+
+def ring_points(ring):
+    """Distinct vertices of a closed ring"""
+    return {tuple(point) for point in ring}
+
+@pytest.fixture(scope='module')
+def decoded_tile(tmp_path_factory):
+    work_dir = tmp_path_factory.mktemp('tiles')
+    input_path = work_dir / 'municipalities.geojson'
+    output_path = work_dir / 'municipalities.mbtiles'
+    input_path.write_text(json.dumps({'type': 'FeatureCollection', 'features': FEATURES}), encoding='utf-8')
+    build_vector_tiles(str(input_path), str(output_path), ZOOM, ZOOM)
+
+    tile_x, tile_y = tile_address(-47, -23.5)
+    tile_data = read_tile(str(output_path), ZOOM, tile_x, tile_y)
+    assert tile_data is not None
+    tile = mapbox_vector_tile.decode(gzip.decompress(tile_data), default_options={'y_coord_down': True})
+    return tile, tile_x, tile_y, str(output_path)
+
+def test_layer_and_attributes(decoded_tile):
+    tile, _, _, _ = decoded_tile
+    layer = tile[LAYER_NAME]
+    assert layer['extent'] == TILE_EXTENT
+    assert layer['version'] == 2
+    features = {feature['id']: feature for feature in layer['features']}
+    assert set(features) == {3550308, 3509502, 5002704}
+    assert features[3550308]['properties'] == {
+        'municipality_code': '3550308', 'municipality_name': 'São Paulo', 'state_code': 'SP'
+    }
+    assert features[3509502]['properties']['state_code'] == 'SP'
+
+def test_polygon_with_hole(decoded_tile):
+    tile, tile_x, tile_y, _ = decoded_tile
+    feature = next(feature for feature in tile[LAYER_NAME]['features'] if feature['id'] == 3550308)
+    # The decoder groups rings by winding, so a hole is only kept inside its polygon when it is wound inversely
+    assert feature['geometry']['type'] == 'Polygon'
+    exterior, hole = feature['geometry']['coordinates']
+    assert ring_points(exterior) == {tile_point(lng, lat, tile_x, tile_y) for lng, lat in square(-47, -24, -46, -23)}
+    assert ring_points(hole) == {
+        tile_point(lng, lat, tile_x, tile_y) for lng, lat in square(-46.8, -23.8, -46.2, -23.2)
+    }
+
+def test_multipolygon(decoded_tile):
+    tile, tile_x, tile_y, _ = decoded_tile
+    feature = next(feature for feature in tile[LAYER_NAME]['features'] if feature['id'] == 3509502)
+    assert feature['geometry']['type'] == 'MultiPolygon'
+    decoded = sorted(sorted(ring_points(polygon[0])) for polygon in feature['geometry']['coordinates'])
+    expected = sorted(
+        sorted({tile_point(lng, lat, tile_x, tile_y) for lng, lat in ring})
+        for ring in (square(-48, -24, -47.5, -23.5), square(-47.4, -22.9, -47.1, -22.6))
+    )
+    assert decoded == expected
+
+def test_clipped_to_buffer(decoded_tile):
+    tile, _, _, _ = decoded_tile
+    feature = next(feature for feature in tile[LAYER_NAME]['features'] if feature['id'] == 5002704)
+    points = ring_points(feature['geometry']['coordinates'][0])
+    assert min(x for x, _ in points) == -TILE_BUFFER
+    assert all(-TILE_BUFFER <= value <= TILE_EXTENT + TILE_BUFFER for point in points for value in point)
+
+def test_missing_tile(decoded_tile):
+    _, tile_x, tile_y, output_path = decoded_tile
+    assert read_tile(output_path, ZOOM, tile_x + 3, tile_y) is None
@@ -0,0 +1,256 @@
+import json
+import os
+
+# Quantized points are packed into one int: x in the high bits, y in the low 32 bits
+_Y_BITS = 32
+_Y_OFFSET = 1 << (_Y_BITS - 1)
+
+def pack_point(x, y):
+    return (x << _Y_BITS) | (y + _Y_OFFSET)
+
+def unpack_point(point):
+    return point >> _Y_BITS, (point & ((1 << _Y_BITS) - 1)) - _Y_OFFSET
+
+def point_importance(points):
+    """Douglas-Peucker importance of each point (squared distance at which it is kept)
+
+    Endpoints are always kept. A point's importance never exceeds its parent's,
+    so simplifying at any tolerance is a single threshold over this list.
+    """
+    count = len(points)
+    importance = [0.0] * count
+    if count:
+        importance[0] = importance[-1] = float('inf')
+    stack = [(0, count - 1, float('inf'))]
+    while stack:
+        start, end, parent = stack.pop()
+        if end - start < 2:
+            continue
+        (x1, y1), (x2, y2) = points[start], points[end]
+        dx, dy = x2 - x1, y2 - y1
+        length_sq = dx * dx + dy * dy
+        farthest, farthest_sq = start + 1, -1.0
+        for i in range(start + 1, end):
+            px, py = points[i]
+            if length_sq == 0:
+                distance_sq = (px - x1) ** 2 + (py - y1) ** 2
+            else:
+                cross = dx * (py - y1) - dy * (px - x1)
+                distance_sq = cross * cross / length_sq
+            if distance_sq > farthest_sq:
+                farthest, farthest_sq = i, distance_sq
+        importance[farthest] = min(farthest_sq, parent)
+        stack.append((start, farthest, importance[farthest]))
+        stack.append((farthest, end, importance[farthest]))
+    return importance
+
+def simplify(points, tolerance, importance=None, min_interior=0):
+    """Douglas-Peucker simplification, keeping at least min_interior interior points"""
+    if len(points) < 3:
+        return points
+    if importance is None:
+        importance = point_importance(points)
+    threshold = tolerance * tolerance
+    keep_at_least = float('inf')
+    if min_interior:
+        ranked = sorted(importance[1:-1], reverse=True)[:min_interior]
+        if ranked:
+            keep_at_least = ranked[-1]
+    return [point for point, weight in zip(points, importance) if weight > threshold or weight >= keep_at_least]
+
+def _open_ring(coordinates, scale):
+    """Quantize a GeoJSON ring to packed int points, without the closing point or repeats"""
+    ring = []
+    for position in coordinates:
+        point = pack_point(int(round(position[0] * scale)), int(round(position[1] * scale)))
+        if not ring or point != ring[-1]:
+            ring.append(point)
+    if len(ring) > 1 and ring[0] == ring[-1]:
+        ring.pop()
+    return ring
+
+def _polygons(geometry):
+    if not geometry:
+        return []
+    if geometry['type'] == 'Polygon':
+        return [geometry['coordinates']]
+    if geometry['type'] == 'MultiPolygon':
+        return geometry['coordinates']
+    return []
+
+class Topology:
+    """Shared-arc topology of polygon features (the TopoJSON model)
+
+    Coordinates are quantized to a fixed decimal precision, rings are cut into
+    arcs at junctions, and an arc shared by two neighbours is stored once.
+    Simplifying the arcs therefore keeps shared borders identical on both sides.
+    """
+
+    def __init__(self, features, decimals=5):
+        self.decimals = decimals
+        self.scale = 10 ** decimals
+        self.arcs = []
+        self._arc_index = {}
+        self.properties = []
+        # Per feature: list of polygons, each a list of rings, each a list of arc refs
+        self.geometries = []
+
+        rings_by_feature = []
+        for feature in features:
+            polygons = []
+            for polygon in _polygons(feature.get('geometry')):
+                rings = [_open_ring(ring, self.scale) for ring in polygon]
+                if rings and len(rings[0]) >= 3:
+                    polygons.append([ring for ring in rings if len(ring) >= 3])
+            rings_by_feature.append(polygons)
+            self.properties.append(feature.get('properties') or {})
+
+        junctions = self._find_junctions(rings_by_feature)
+        for polygons in rings_by_feature:
+            self.geometries.append([
+                [self._ring_arcs(ring, junctions) for ring in polygon]
+                for polygon in polygons
+            ])
+        self._importance = None
+
+    @staticmethod
+    def _find_junctions(rings_by_feature):
+        """Points where shared borders start or end: seen with different neighbours"""
+        neighbours = {}
+        junctions = set()
+        for polygons in rings_by_feature:
+            for polygon in polygons:
+                for ring in polygon:
+                    count = len(ring)
+                    for i, point in enumerate(ring):
+                        previous, following = ring[i - 1], ring[(i + 1) % count]
+                        seen = neighbours.get(point)
+                        if seen is None:
+                            neighbours[point] = (previous, following)
+                        elif seen != (previous, following) and seen != (following, previous):
+                            junctions.add(point)
+        return junctions
+
+    def _ring_arcs(self, ring, junctions):
+        """Cut one ring into arcs at its junctions and return their refs"""
+        cuts = [i for i, point in enumerate(ring) if point in junctions]
+        if not cuts:
+            # Junction-free ring (island or enclave): start at its smallest point so the
+            # neighbour that shares the whole loop produces the same arc
+            start = ring.index(min(ring))
+            ring = ring[start:] + ring[:start]
+            return [self._arc_ref(ring + [ring[0]])]
+
+        ring = ring[cuts[0]:] + ring[:cuts[0]]
+        cuts = [i - cuts[0] for i in cuts] + [len(ring)]
+        ring = ring + [ring[0]]
+        return [self._arc_ref(ring[start:end + 1]) for start, end in zip(cuts, cuts[1:])]
+
+    def _arc_ref(self, arc):
+        """Index of an arc, ~index when it is stored reversed; new arcs are appended"""
+        key = tuple(arc)
+        ref = self._arc_index.get(key)
+        if ref is not None:
+            return ref
+        ref = self._arc_index.get(key[::-1])
+        if ref is not None:
+            return ~ref
+        ref = len(self.arcs)
+        self.arcs.append(arc)
+        self._arc_index[key] = ref
+        return ref
+
+    def simplified_arcs(self, tolerance):
+        """Arcs simplified at tolerance (degrees), in quantized units"""
+        if tolerance <= 0:
+            return [[unpack_point(point) for point in arc] for arc in self.arcs]
+        if self._importance is None:
+            self._importance = []
+            for arc in self.arcs:
+                points = [unpack_point(point) for point in arc]
+                self._importance.append((points, point_importance(points)))
+
+        tolerance_units = tolerance * self.scale
+        arcs = []
+        for points, importance in self._importance:
+            # Keep one interior point per arc (two for closed loops) so no ring degenerates
+            closed = points[0] == points[-1]
+            arcs.append(simplify(points, tolerance_units, importance, min_interior=2 if closed else 1))
+        return arcs
+
+    def vertex_count(self, arcs):
+        return sum(len(arc) for arc in arcs)
+
+    def _ring_coordinates(self, refs, arcs, decimals):
+        divisor = self.scale
+        ring = []
+        for ref in refs:
+            points = arcs[ref] if ref >= 0 else arcs[~ref][::-1]
+            for x, y in (points if not ring else points[1:]):
+                position = [round(x / divisor, decimals), round(y / divisor, decimals)]
+                if not ring or position != ring[-1]:
+                    ring.append(position)
+        return ring
+
+    def iter_geojson_features(self, arcs, decimals):
+        """Rebuild GeoJSON features from (simplified) arcs at a fixed decimal precision"""
+        for properties, polygons in zip(self.properties, self.geometries):
+            coordinates = []
+            for polygon in polygons:
+                rings = [self._ring_coordinates(refs, arcs, decimals) for refs in polygon]
+                # Rings that collapsed at this precision are dropped
+                rings = [ring for ring in rings if len(ring) >= 4]
+                if rings:
+                    coordinates.append(rings)
+            if not coordinates:
+                geometry = None
+            elif len(coordinates) == 1:
+                geometry = {'type': 'Polygon', 'coordinates': coordinates[0]}
+            else:
+                geometry = {'type': 'MultiPolygon', 'coordinates': coordinates}
+            yield {'type': 'Feature', 'properties': properties, 'geometry': geometry}
+
+    def write_topojson(self, arcs, decimals, f, object_name='municipalities'):
+        """Write quantized, delta-encoded TopoJSON with each shared border stored once to f
+
+        Geometries and arcs are encoded and written one at a time.
+        """
+        step = 10 ** (self.decimals - decimals)
+        min_x = min((x for arc in arcs for x, _ in arc), default=0)
+        min_y = min((y for arc in arcs for _, y in arc), default=0)
+
+        def dumps(value):
+            return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+        transform = {
+            'scale': [1 / 10 ** decimals, 1 / 10 ** decimals],
+            'translate': [min_x / self.scale, min_y / self.scale]
+        }
+        f.write(f'{{"type":"Topology","transform":{dumps(transform)},"objects":{{{dumps(object_name)}:')
+        f.write('{"type":"GeometryCollection","geometries":[')
+        for index, (properties, polygons) in enumerate(zip(self.properties, self.geometries)):
+            if not polygons:
+                geometry = {'type': None, 'properties': properties}
+            elif len(polygons) == 1:
+                geometry = {'type': 'Polygon', 'arcs': polygons[0], 'properties': properties}
+            else:
+                geometry = {'type': 'MultiPolygon', 'arcs': polygons, 'properties': properties}
+            f.write((',' if index else '') + dumps(geometry))
+        f.write(']}},"arcs":[')
+        for index, arc in enumerate(arcs):
+            encoded = []
+            previous_x = previous_y = 0
+            for x, y in arc:
+                qx, qy = round((x - min_x) / step), round((y - min_y) / step)
+                if encoded and (qx, qy) == (previous_x, previous_y):
+                    continue
+                encoded.append([qx - previous_x, qy - previous_y])
+                previous_x, previous_y = qx, qy
+            f.write((',' if index else '') + dumps(encoded))
+        f.write(']}')
+
+def write_json(data, path):
+    """Write compact JSON and return its size in bytes"""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+    return os.path.getsize(path)
@@ -0,0 +1,314 @@
+import gzip
+import json
+import math
+import os
+import sqlite3
+import sys
+
+from boundary_index import (
+    CODE_PROPERTIES, IBGE_STATE_PREFIXES, NAME_PROPERTIES, STATE_PROPERTIES, first_property
+)
+from topology import simplify
+
+# Tile settings: MVT extent (units per tile side), clip buffer and zoom range
+TILE_EXTENT = 4096
+TILE_BUFFER = 64
+MIN_ZOOM = 3
+MAX_ZOOM = 10
+LAYER_NAME = 'municipalities'
+
+# Douglas-Peucker tolerance in tile units; ~1/4 pixel of a 256px tile at every zoom
+SIMPLIFY_TOLERANCE = 4.0
+
+INPUT_PATH = 'static/data/brazil_municipalities_all.geojson'
+OUTPUT_PATH = 'data/municipalities.mbtiles'
+
+# --- Protobuf encoding (vector_tile.proto, version 2) ---
+
+def _varint(value):
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+def _zigzag(value):
+    return (value << 1) ^ (value >> 63)
+
+def _field(number, wire_type):
+    return _varint((number << 3) | wire_type)
+
+def _message(number, payload):
+    return _field(number, 2) + _varint(len(payload)) + payload
+
+def _packed(number, values):
+    return _message(number, b''.join(_varint(value) for value in values))
+
+def encode_polygon_geometry(rings):
+    """Encode rings (lists of integer (x, y), not closed) as MVT geometry commands"""
+    commands = []
+    cursor_x = cursor_y = 0
+    for ring in rings:
+        for i, (x, y) in enumerate(ring):
+            if i == 0:
+                commands.append(1 | (1 << 3))  # MoveTo, count 1
+            elif i == 1:
+                commands.append(2 | ((len(ring) - 1) << 3))  # LineTo, count n - 1
+            commands.append(_zigzag(x - cursor_x))
+            commands.append(_zigzag(y - cursor_y))
+            cursor_x, cursor_y = x, y
+        commands.append(7 | (1 << 3))  # ClosePath
+    return commands
+
+def encode_layer(features, keys, values):
+    """Encode one MVT layer; features are (id, tags, geometry commands)"""
+    layer = _field(15, 0) + _varint(2) + _message(1, LAYER_NAME.encode('utf-8'))
+    for feature_id, tags, geometry in features:
+        feature = _field(1, 0) + _varint(feature_id)
+        feature += _packed(2, tags)
+        feature += _field(3, 0) + _varint(3)  # POLYGON
+        feature += _packed(4, geometry)
+        layer += _message(2, feature)
+    for key in keys:
+        layer += _message(3, key.encode('utf-8'))
+    for value in values:
+        layer += _message(4, _message(1, value.encode('utf-8')))
+    layer += _field(5, 0) + _varint(TILE_EXTENT)
+    return _message(3, layer)
+
+# --- Geometry ---
+
+def project(lng, lat):
+    """Longitude/latitude to normalized Web Mercator (0..1, y down)"""
+    lat = max(min(lat, 85.0511), -85.0511)
+    x = (lng + 180.0) / 360.0
+    sin_lat = math.sin(math.radians(lat))
+    y = 0.5 - math.log((1 + sin_lat) / (1 - sin_lat)) / (4 * math.pi)
+    return x, y
+
+def iter_polygons(geometry):
+    """Yield each polygon (list of rings) of a Polygon/MultiPolygon geometry"""
+    if not geometry:
+        return
+    if geometry['type'] == 'Polygon':
+        yield geometry['coordinates']
+    elif geometry['type'] == 'MultiPolygon':
+        yield from geometry['coordinates']
+
+def ring_area(ring):
+    """Signed area (surveyor's formula); positive is clockwise with y pointing down"""
+    area = 0
+    for i in range(len(ring)):
+        x1, y1 = ring[i - 1]
+        x2, y2 = ring[i]
+        area += x1 * y2 - x2 * y1
+    return area / 2
+
+def clip_ring(ring, min_x, min_y, max_x, max_y):
+    """Sutherland-Hodgman clipping of a ring against an axis-aligned box"""
+    def clip(points, inside, intersect):
+        if not points:
+            return points
+        result = []
+        previous = points[-1]
+        for current in points:
+            if inside(current):
+                if not inside(previous):
+                    result.append(intersect(previous, current))
+                result.append(current)
+            elif inside(previous):
+                result.append(intersect(previous, current))
+            previous = current
+        return result
+
+    def at_x(x):
+        return lambda a, b: (x, a[1] + (b[1] - a[1]) * (x - a[0]) / (b[0] - a[0]))
+
+    def at_y(y):
+        return lambda a, b: (a[0] + (b[0] - a[0]) * (y - a[1]) / (b[1] - a[1]), y)
+
+    ring = clip(ring, lambda p: p[0] >= min_x, at_x(min_x))
+    ring = clip(ring, lambda p: p[0] <= max_x, at_x(max_x))
+    ring = clip(ring, lambda p: p[1] >= min_y, at_y(min_y))
+    ring = clip(ring, lambda p: p[1] <= max_y, at_y(max_y))
+    return ring
+
+def tile_rings(polygons, origin_x, origin_y):
+    """Clip, quantize and orient projected polygons for one tile"""
+    rings = []
+    low, high = -TILE_BUFFER, TILE_EXTENT + TILE_BUFFER
+    for polygon in polygons:
+        for ring_index, ring in enumerate(polygon):
+            shifted = [(x - origin_x, y - origin_y) for x, y in ring]
+            clipped = clip_ring(shifted, low, low, high, high)
+
+            quantized = []
+            for x, y in clipped:
+                point = (int(round(x)), int(round(y)))
+                if not quantized or point != quantized[-1]:
+                    quantized.append(point)
+            if len(quantized) > 1 and quantized[0] == quantized[-1]:
+                quantized.pop()
+            if len(quantized) < 3:
+                if ring_index == 0:
+                    break  # exterior vanished; skip its holes too
+                continue
+
+            area = ring_area(quantized)
+            if area == 0:
+                if ring_index == 0:
+                    break
+                continue
+            # Exterior rings must have positive area, holes negative
+            if (ring_index == 0) != (area > 0):
+                quantized.reverse()
+            rings.append(quantized)
+    return rings
+
+# --- Tiling ---
+
+def feature_attributes(properties):
+    code = first_property(properties, CODE_PROPERTIES) or ''
+    state_code = first_property(properties, STATE_PROPERTIES) or IBGE_STATE_PREFIXES.get(code[:2], '')
+    return {
+        'municipality_code': code,
+        'municipality_name': first_property(properties, NAME_PROPERTIES) or '',
+        'state_code': state_code
+    }
+
+def build_zoom_tiles(features, zoom):
+    """Cut every feature into the tiles it touches at one zoom level"""
+    scale = (2 ** zoom) * TILE_EXTENT
+    last_tile = 2 ** zoom - 1
+    tiles = {}
+
+    for feature_id, attributes, polygons in features:
+        # Project to this zoom's tile-unit space and simplify once per feature
+        projected = []
+        for polygon in polygons:
+            rings = []
+            for ring in polygon:
+                points = [(x * scale, y * scale) for x, y in ring]
+                simplified = simplify(points, SIMPLIFY_TOLERANCE)
+                if len(simplified) >= 4:
+                    rings.append(simplified)
+            if rings:
+                projected.append(rings)
+        if not projected:
+            continue
+
+        xs = [x for polygon in projected for x, _ in polygon[0]]
+        ys = [y for polygon in projected for _, y in polygon[0]]
+        first_x = max(int((min(xs) - TILE_BUFFER) // TILE_EXTENT), 0)
+        last_x = min(int((max(xs) + TILE_BUFFER) // TILE_EXTENT), last_tile)
+        first_y = max(int((min(ys) - TILE_BUFFER) // TILE_EXTENT), 0)
+        last_y = min(int((max(ys) + TILE_BUFFER) // TILE_EXTENT), last_tile)
+
+        for tile_x in range(first_x, last_x + 1):
+            for tile_y in range(first_y, last_y + 1):
+                rings = tile_rings(projected, tile_x * TILE_EXTENT, tile_y * TILE_EXTENT)
+                if rings:
+                    tiles.setdefault((tile_x, tile_y), []).append((feature_id, attributes, rings))
+    return tiles
+
+def encode_tile(tile_features):
+    """Encode the features of one tile into a single-layer MVT"""
+    keys, key_index = [], {}
+    values, value_index = [], {}
+    encoded = []
+    for feature_id, attributes, rings in tile_features:
+        tags = []
+        for key, value in attributes.items():
+            if key not in key_index:
+                key_index[key] = len(keys)
+                keys.append(key)
+            if value not in value_index:
+                value_index[value] = len(values)
+                values.append(value)
+            tags.extend((key_index[key], value_index[value]))
+        encoded.append((feature_id, tags, encode_polygon_geometry(rings)))
+    return encode_layer(encoded, keys, values)
+
+def create_mbtiles(path, min_zoom, max_zoom):
+    temp_path = f"{path}.tmp"
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+    connection = sqlite3.connect(temp_path)
+    connection.execute('CREATE TABLE metadata (name TEXT, value TEXT)')
+    connection.execute(
+        'CREATE TABLE tiles (zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_data BLOB)'
+    )
+    connection.execute('CREATE UNIQUE INDEX tile_index ON tiles (zoom_level, tile_column, tile_row)')
+    metadata = {
+        'name': LAYER_NAME,
+        'format': 'pbf',
+        'minzoom': str(min_zoom),
+        'maxzoom': str(max_zoom),
+        'bounds': '-73.99,-33.77,-28.84,5.28',
+        'center': '-51.9253,-14.2350,4',
+        'json': json.dumps({'vector_layers': [{
+            'id': LAYER_NAME,
+            'fields': {'municipality_code': 'String', 'municipality_name': 'String', 'state_code': 'String'},
+            'minzoom': min_zoom,
+            'maxzoom': max_zoom
+        }]})
+    }
+    connection.executemany('INSERT INTO metadata VALUES (?, ?)', metadata.items())
+    return connection, temp_path
+
+def build_vector_tiles(input_path=INPUT_PATH, output_path=OUTPUT_PATH, min_zoom=MIN_ZOOM, max_zoom=MAX_ZOOM):
+    """Cut the combined municipality boundaries into gzipped MVT tiles stored in an MBTiles file"""
+    with open(input_path, 'r', encoding='utf-8') as f:
+        geojson = json.load(f)
+
+    # Project once to normalized Web Mercator; each zoom only scales
+    features = []
+    for index, feature in enumerate(geojson.get('features', [])):
+        attributes = feature_attributes(feature.get('properties') or {})
+        code = attributes['municipality_code']
+        feature_id = int(code) if code.isdigit() else index + 1
+        polygons = [
+            [[project(lng, lat) for lng, lat, *_ in ring] for ring in polygon]
+            for polygon in iter_polygons(feature.get('geometry'))
+        ]
+        features.append((feature_id, attributes, polygons))
+    print(f"Loaded {len(features)} municipalities from {input_path}")
+
+    connection, temp_path = create_mbtiles(output_path, min_zoom, max_zoom)
+    for zoom in range(min_zoom, max_zoom + 1):
+        tiles = build_zoom_tiles(features, zoom)
+        total_bytes = 0
+        for (tile_x, tile_y), tile_features in tiles.items():
+            tile_data = gzip.compress(encode_tile(tile_features), mtime=0)
+            total_bytes += len(tile_data)
+            # MBTiles rows use the TMS scheme (y axis flipped)
+            connection.execute(
+                'INSERT INTO tiles VALUES (?, ?, ?, ?)',
+                (zoom, tile_x, 2 ** zoom - 1 - tile_y, tile_data)
+            )
+        connection.commit()
+        print(f"Zoom {zoom}: {len(tiles)} tiles, {total_bytes / 1024:.1f} KB")
+
+    connection.close()
+    os.replace(temp_path, output_path)
+    print(f"Vector tiles saved to {output_path}")
+
+def read_tile(mbtiles_path, zoom, tile_x, tile_y):
+    """Gzipped MVT bytes for an XYZ tile address, or None when the tile is empty"""
+    connection = sqlite3.connect(f"file:{mbtiles_path}?mode=ro", uri=True)
+    try:
+        row = connection.execute(
+            'SELECT tile_data FROM tiles WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?',
+            (zoom, tile_x, 2 ** zoom - 1 - tile_y)
+        ).fetchone()
+    finally:
+        connection.close()
+    return row[0] if row else None
+
+if __name__ == "__main__":
+    zooms = [int(arg) for arg in sys.argv[1:3]]
+    build_vector_tiles(*([INPUT_PATH, OUTPUT_PATH] + zooms))